@@ -10,10 +10,14 @@
 3. Сохраняем результаты для сравнения
 """
 
+import argparse
+import hashlib
+import logging
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
 
 # Добавляем текущую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -22,24 +26,75 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import config
+import json_io
 from translator import Translator
 from translation_memory import TranslationMemory
 
+log = logging.getLogger(__name__)
 
-def check_api_keys():
-    """Проверить наличие API ключей."""
-    keys = {
-        'OpenAI (GPT-4)': bool(config.OPENAI_API_KEY),
-        'Anthropic (Claude)': bool(config.ANTHROPIC_API_KEY),
-        'DeepSeek': bool(config.DEEPSEEK_API_KEY),
-        'Grok (xAI)': bool(config.GROK_API_KEY),
-        'DeepL (MT)': bool(config.DEEPL_API_KEY),
-    }
+# Инициализация Translator пишет glossary.json - выполняем её по очереди
+_init_lock = threading.Lock()
+# Блокировка для читаемого вывода баннеров из параллельных потоков
+_print_lock = threading.Lock()
+
+# Отображаемое имя -> атрибут config с API ключом
+_API_KEYS = (
+    ('OpenAI (GPT-4)', 'OPENAI_API_KEY'),
+    ('Anthropic (Claude)', 'ANTHROPIC_API_KEY'),
+    ('DeepSeek', 'DEEPSEEK_API_KEY'),
+    ('Grok (xAI)', 'GROK_API_KEY'),
+    ('DeepL (MT)', 'DEEPL_API_KEY'),
+)
+_KEY_STATUS = {True: "✅", False: "❌"}
+
+# LLM для сравнения: (имя редактора, имя ключа в _API_KEYS, суффикс файла)
+_ENGINES = (
+    ('gpt4', 'OpenAI (GPT-4)', 'GPT4'),
+    ('claude', 'Anthropic (Claude)', 'Claude'),
+    ('deepseek', 'DeepSeek', 'DeepSeek'),
+    ('grok', 'Grok (xAI)', 'Grok'),
+)
+
+# Кеш результата check_api_keys между запусками
+KEYS_CACHE_FILE = ".llm_keys_cache"
+
+
+def _keys_fingerprint() -> str:
+    """Хеш текущих значений API ключей (сами ключи на диск не пишутся)."""
+    items = sorted(f"{attr}={getattr(config, attr) or ''}" for _, attr in _API_KEYS)
+    return hashlib.blake2b("|".join(items).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def check_api_keys(refresh: bool = False):
+    """
+    Проверить наличие API ключей.
+    
+    Результат кешируется в KEYS_CACHE_FILE; если ключи в окружении
+    не менялись, проверка и вывод баннера пропускаются.
+    
+    Args:
+        refresh: Игнорировать кеш и проверить ключи заново
+    """
+    fingerprint = _keys_fingerprint()
+    
+    if not refresh:
+        try:
+            cached = json_io.load(KEYS_CACHE_FILE)
+            if cached.get('fingerprint') == fingerprint:
+                return cached['keys']
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    keys = {name: bool(getattr(config, attr)) for name, attr in _API_KEYS}
     
     print("\n📋 Проверка API ключей:")
     for name, available in keys.items():
-        status = "✅" if available else "❌"
-        print(f"   {status} {name}")
+        print(f"   {_KEY_STATUS[available]} {name}")
+    
+    try:
+        json_io.dump({'fingerprint': fingerprint, 'keys': keys}, KEYS_CACHE_FILE, indent=False)
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить кеш ключей: {e}")
     
     return keys
 
@@ -53,9 +108,16 @@ def clear_tm():
 
 def clear_mt_cache():
     """Очистить кеш MT для свежего перевода."""
-    cache_file = "mt_cache.json"
-    if os.path.exists(cache_file):
-        os.remove(cache_file)
+    # База вместе с файлами WAL и JSON кешем прежнего формата:
+    # иначе при следующем запуске он снова перенёсся бы в базу
+    removed = False
+    for cache_file in ("mt_cache.db", "mt_cache.db-wal", "mt_cache.db-shm", "mt_cache.json"):
+        try:
+            os.remove(cache_file)
+            removed = True
+        except FileNotFoundError:
+            pass
+    if removed:
         print("✓ MT кеш очищен")
 
 
@@ -68,19 +130,21 @@ def translate_with_llm(llm_name: str, input_file: str, output_file: str):
         input_file: Путь к входному файлу
         output_file: Путь к выходному файлу
     """
-    print(f"\n{'='*60}")
-    print(f"🔄 Перевод с {llm_name.upper()}")
-    print(f"{'='*60}")
+    with _print_lock:
+        print(f"\n{'='*60}")
+        print(f"🔄 Перевод с {llm_name.upper()}")
+        print(f"{'='*60}")
     
     try:
-        translator = Translator(
-            mt_engine="deepl",
-            llm_editor=llm_name,
-            use_tm=False,          # Не используем TM для честного сравнения
-            use_cache=True,        # Используем MT кеш (экономия)
-            use_placeholders=True,
-            glossary_file="pintek_glossary.json"
-        )
+        with _init_lock:
+            translator = Translator(
+                mt_engine="deepl",
+                llm_editor=llm_name,
+                use_tm=False,          # Не используем TM для честного сравнения
+                use_cache=True,        # Используем MT кеш (экономия)
+                use_placeholders=True,
+                glossary_file="pintek_glossary.json"
+            )
         
         translator.translate_docx(
             input_path=input_file,
@@ -89,18 +153,25 @@ def translate_with_llm(llm_name: str, input_file: str, output_file: str):
             use_glossary=True
         )
         
-        print(f"✅ {llm_name.upper()} завершён: {output_file}")
+        with _print_lock:
+            print(f"✅ {llm_name.upper()} завершён: {output_file}")
         return True
         
     except Exception as e:
-        print(f"❌ Ошибка {llm_name}: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Ошибка %s: %s", llm_name, e)
         return False
 
 
 def main():
     """Сравнить все LLM."""
+    parser = argparse.ArgumentParser(description="Сравнение качества пост-редактирования всех LLM")
+    parser.add_argument('--refresh-keys', action='store_true',
+                        help='Проверить API ключи заново, игнорируя кеш')
+    args = parser.parse_args()
+    
+    # Корневой логгер - WARNING: иначе httpx/openai пишут строку INFO на каждый запрос
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(threadName)s] %(message)s")
+    log.setLevel(logging.INFO)
     
     print("="*70)
     print("🔬 СРАВНЕНИЕ КАЧЕСТВА ПОСТ-РЕДАКТИРОВАНИЯ LLM")
@@ -109,11 +180,13 @@ def main():
     print("="*70)
     
     # Проверяем API ключи
-    keys = check_api_keys()
+    keys = check_api_keys(refresh=args.refresh_keys)
     
     # Входной файл
     input_file = "Input/Pintek ch1 RU.docx"
-    if not os.path.exists(input_file):
+    try:
+        os.stat(input_file)
+    except FileNotFoundError:
         print(f"❌ Файл не найден: {input_file}")
         return
     
@@ -124,19 +197,11 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # Определяем LLM для тестирования
-    llms_to_test = []
-    
-    if keys['OpenAI (GPT-4)']:
-        llms_to_test.append(('gpt4', f'Output/Pintek_ch1_GPT4_{timestamp}.docx'))
-    
-    if keys['Anthropic (Claude)']:
-        llms_to_test.append(('claude', f'Output/Pintek_ch1_Claude_{timestamp}.docx'))
-    
-    if keys['DeepSeek']:
-        llms_to_test.append(('deepseek', f'Output/Pintek_ch1_DeepSeek_{timestamp}.docx'))
-    
-    if keys['Grok (xAI)']:
-        llms_to_test.append(('grok', f'Output/Pintek_ch1_Grok_{timestamp}.docx'))
+    llms_to_test = [
+        (slug, f'Output/Pintek_ch1_{tag}_{timestamp}.docx')
+        for slug, key_name, tag in _ENGINES
+        if keys.get(key_name)
+    ]
     
     if not llms_to_test:
         print("\n❌ Нет доступных LLM API ключей!")
@@ -152,9 +217,20 @@ def main():
     # Результаты
     results = {}
     
-    # Переводим с каждым LLM
+    # Первый LLM переводим отдельно: он прогревает общий MT кеш, иначе все
+    # потоки одновременно промахнутся по тем же параграфам и каждый оплатит DeepL.
+    # Остальные LLM получают MT из кеша и идут параллельно
+    first_name, first_output = llms_to_test[0]
+    outcomes = {first_name: translate_with_llm(first_name, input_file, first_output)}
+    with ThreadPoolExecutor(max_workers=max(len(llms_to_test) - 1, 1)) as executor:
+        futures = {
+            llm_name: executor.submit(translate_with_llm, llm_name, input_file, output_file)
+            for llm_name, output_file in llms_to_test[1:]
+        }
+        outcomes.update((llm_name, future.result()) for llm_name, future in futures.items())
+    
     for llm_name, output_file in llms_to_test:
-        success = translate_with_llm(llm_name, input_file, output_file)
+        success = outcomes[llm_name]
         results[llm_name] = {
             'success': success,
             'output_file': output_file if success else None
@@ -193,8 +269,7 @@ def main():
     }
     
     report_file = f"Output/comparison_report_{timestamp}.json"
-    with open(report_file, 'w', encoding='utf-8') as f:
-        json.dump(report, f, ensure_ascii=False, indent=2)
+    json_io.dump(report, report_file)
     
     print(f"\n📋 Отчёт сохранён: {report_file}")
     print("\n" + "="*70)
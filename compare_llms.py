@@ -3,12 +3,23 @@
 Переводит первую главу всеми доступными LLM и создает отчет сравнения.
 """
 
+import logging
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from translator import Translator
+from translation_memory import TranslationMemory
 from config import *
 from docx_handler import DocxHandler
 
+log = logging.getLogger(__name__)
+
+# Инициализация Translator пишет glossary.json - выполняем её по очереди
+_init_lock = threading.Lock()
+# Блокировка для читаемого вывода баннеров из параллельных потоков
+_print_lock = threading.Lock()
+
 
 def check_available_llms():
     """Проверить, какие LLM доступны."""
@@ -28,7 +39,7 @@ def check_available_llms():
     return available
 
 
-def translate_with_llm(input_file: str, output_file: str, llm_name: str):
+def translate_with_llm(input_file: str, output_file: str, llm_name: str, tm: TranslationMemory = None):
     """
     Перевести файл с использованием указанного LLM.
     
@@ -36,17 +47,21 @@ def translate_with_llm(input_file: str, output_file: str, llm_name: str):
         input_file: Путь к исходному файлу
         output_file: Путь для сохранения перевода
         llm_name: Название LLM (gpt4, claude, deepseek, grok, crok)
+        tm: Общая Translation Memory параллельных переводов
     """
-    print(f"\n{'='*60}")
-    print(f"Перевод с использованием: {llm_name.upper()}")
-    print(f"{'='*60}")
+    with _print_lock:
+        print(f"\n{'='*60}")
+        print(f"Перевод с использованием: {llm_name.upper()}")
+        print(f"{'='*60}")
     
     try:
-        translator = Translator(
-            mt_engine="deepl",
-            llm_editor=llm_name,
-            use_tm=True
-        )
+        with _init_lock:
+            translator = Translator(
+                mt_engine="deepl",
+                llm_editor=llm_name,
+                use_tm=True,
+                tm=tm
+            )
         
         translator.translate_docx(
             input_path=input_file,
@@ -55,13 +70,12 @@ def translate_with_llm(input_file: str, output_file: str, llm_name: str):
             use_glossary=True
         )
         
-        print(f"✓ Перевод завершен: {output_file}")
+        with _print_lock:
+            print(f"✓ Перевод завершен: {output_file}")
         return True
         
     except Exception as e:
-        print(f"✗ Ошибка при переводе с {llm_name}: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("✗ Ошибка при переводе с %s: %s", llm_name, e)
         return False
 
 
@@ -113,6 +127,10 @@ def create_comparison_report(results: dict, output_file: str = "llm_comparison_r
 
 
 def main():
+    # Корневой логгер - WARNING: иначе httpx/openai пишут строку INFO на каждый запрос
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(threadName)s] %(message)s")
+    log.setLevel(logging.INFO)
+    
     input_file = "Input/Pintek ch1 RU.docx"
     
     # Проверяем наличие исходного файла
@@ -145,11 +163,21 @@ def main():
     
     results = {}
     
-    # Переводим каждым доступным LLM
-    for llm in available_llms:
-        output_file = f"Output/Pintek_ch1_EN_{llm}.docx"
-        success = translate_with_llm(input_file, output_file, llm)
-        results[llm] = success
+    # Первый LLM переводим отдельно: он прогревает общий MT кеш, иначе все
+    # потоки одновременно промахнутся по тем же параграфам и каждый оплатит DeepL.
+    # Остальные LLM получают MT из кеша и идут параллельно.
+    # TM тоже одна на все потоки: save() пишет весь список экземпляра, и отдельные
+    # экземпляры на одном файле затирали бы сегменты друг друга
+    tm = TranslationMemory()
+    first_llm = available_llms[0]
+    results[first_llm] = translate_with_llm(input_file, f"Output/Pintek_ch1_EN_{first_llm}.docx", first_llm, tm)
+    with ThreadPoolExecutor(max_workers=max(len(available_llms) - 1, 1)) as executor:
+        futures = {
+            llm: executor.submit(translate_with_llm, input_file, f"Output/Pintek_ch1_EN_{llm}.docx", llm, tm)
+            for llm in available_llms[1:]
+        }
+        for llm in available_llms[1:]:
+            results[llm] = futures[llm].result()
     
     # Создаем отчет
     create_comparison_report(results)
@@ -3,31 +3,121 @@
 Анализирует переведенные файлы и создает детальный отчет сравнения.
 """
 
+import io
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from docx_handler import DocxHandler
-from typing import Dict, List
-import json
+from typing import Dict, List, Optional, Set, Tuple
+import json_io
+
+# Aho–Corasick находит все термины глоссария за один проход по параграфу
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# NumPy ускоряет поиск кириллицы в длинных параграфах
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Кириллица (U+0400–U+04FF) - признак непереведённого русского текста
+_CYR_RE = re.compile('[\u0400-\u04FF]')
+# С какой длины векторная проверка выгоднее регулярного выражения
+_NUMPY_MIN_LEN = 4096
+
+
+def _has_cyrillic(text: str) -> bool:
+    """Проверить, есть ли в тексте кириллица."""
+    # CPython хранит признак ASCII-строки, проверка бесплатна
+    if text.isascii():
+        return False
+    if NUMPY_AVAILABLE and len(text) >= _NUMPY_MIN_LEN:
+        # Суррогатные пары UTF-16 (0xD800–0xDFFF) в диапазон не попадают
+        units = np.frombuffer(text.encode('utf-16-le'), dtype=np.uint16)
+        return bool(((units >= 0x0400) & (units <= 0x04FF)).any())
+    return _CYR_RE.search(text) is not None
 
 
 class TranslationQualityComparator:
     """Класс для сравнения качества переводов."""
     
-    def __init__(self, glossary_file: str = "glossary.json"):
+    def __init__(self, glossary_file: str = "glossary.json", glossary: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            glossary_file: Путь к файлу глоссария
+            glossary: Уже загруженный глоссарий (тогда файл не читается)
+        """
         self.glossary_file = glossary_file
-        self.glossary = self._load_glossary()
+        self.glossary = glossary if glossary is not None else self._load_glossary()
         self.docx_handler = DocxHandler()
+        # Термины в нижнем регистре считаем один раз, а не на каждый параграф
+        self._glossary_pairs = [(s.lower(), t.lower(), s) for s, t in self.glossary.items()]
+        self._automaton = self._build_automaton() if AHOCORASICK_AVAILABLE else None
+        # Позиция термина в глоссарии - для стабильного порядка нарушений
+        self._term_order = {source: i for i, source in enumerate(self.glossary)}
     
     def _load_glossary(self) -> Dict[str, str]:
         """Загрузить глоссарий."""
         if os.path.exists(self.glossary_file):
             try:
-                with open(self.glossary_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return json_io.load(self.glossary_file)
             except Exception as e:
                 print(f"Ошибка загрузки глоссария: {e}")
                 return {}
         return {}
     
+    def _build_automaton(self):
+        """
+        Построить автомат по всем исходным и целевым терминам глоссария.
+        
+        Значение каждого слова - пары (вид, исходный термин), так как одно
+        и то же слово может быть целевым для нескольких терминов.
+        """
+        words: Dict[str, List[Tuple[str, str]]] = {}
+        for source_lower, target_lower, source in self._glossary_pairs:
+            if source_lower:
+                words.setdefault(source_lower, []).append(('s', source))
+            if target_lower:
+                words.setdefault(target_lower, []).append(('t', source))
+        
+        if not words:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for word, refs in words.items():
+            automaton.add_word(word, refs)
+        automaton.make_automaton()
+        return automaton
+    
+    def _find_terms(self, para_lower: str) -> Tuple[Set[str], Set[str]]:
+        """
+        Найти термины глоссария в параграфе.
+        
+        Returns:
+            (исходные термины, найденные в тексте;
+             исходные термины, чей перевод найден в тексте)
+        """
+        src_hits: Set[str] = set()
+        tgt_hits: Set[str] = set()
+        
+        if self._automaton is not None:
+            for _, refs in self._automaton.iter(para_lower):
+                for kind, source in refs:
+                    (src_hits if kind == 's' else tgt_hits).add(source)
+            return src_hits, tgt_hits
+        
+        for source_lower, target_lower, source in self._glossary_pairs:
+            if source_lower in para_lower:
+                src_hits.add(source)
+            if target_lower in para_lower:
+                tgt_hits.add(source)
+        return src_hits, tgt_hits
+    
     def analyze_file(self, file_path: str) -> Dict:
         """
         Анализировать качество перевода в файле.
@@ -58,25 +148,23 @@ class TranslationQualityComparator:
             para_lower = para.lower()
             
             # Проверка на русский текст (кириллица)
-            if any('\u0400' <= char <= '\u04FF' for char in para):
+            if _has_cyrillic(para):
                 metrics['has_russian_text'] = True
                 metrics['russian_paragraphs'].append(i + 1)
             
             # Проверка соответствия глоссарию
-            for source, target in self.glossary.items():
-                source_lower = source.lower()
-                target_lower = target.lower()
-                
-                # Если найдено русское слово вместо английского перевода
-                if source_lower in para_lower and target_lower not in para_lower:
-                    metrics['glossary_violations'].append({
-                        'paragraph': i + 1,
-                        'source': source,
-                        'expected': target,
-                        'text_snippet': para[:100] + '...' if len(para) > 100 else para
-                    })
-                elif target_lower in para_lower:
-                    metrics['glossary_compliance'] += 1
+            src_hits, tgt_hits = self._find_terms(para_lower)
+            metrics['glossary_compliance'] += len(tgt_hits)
+            
+            # Нарушение - русское слово найдено, а английский перевод нет
+            # (в порядке глоссария, как и раньше)
+            for source in sorted(src_hits - tgt_hits, key=self._term_order.__getitem__):
+                metrics['glossary_violations'].append({
+                    'paragraph': i + 1,
+                    'source': source,
+                    'expected': self.glossary[source],
+                    'text_snippet': para[:100] + '...' if len(para) > 100 else para
+                })
         
         return metrics
     
@@ -94,13 +182,22 @@ class TranslationQualityComparator:
         
         results = {}
         
-        for file_path in file_paths:
-            if os.path.exists(file_path):
-                print(f"\nАнализ файла: {os.path.basename(file_path)}")
-                metrics = self.analyze_file(file_path)
-                if metrics:
-                    llm_name = self._extract_llm_name(file_path)
-                    results[llm_name] = metrics
+        existing = [p for p in file_paths if os.path.exists(p)]
+        for file_path in existing:
+            print(f"\nАнализ файла: {os.path.basename(file_path)}")
+        
+        # Файлы независимы, а анализ упирается в CPU - разбираем их
+        # в отдельных процессах, передавая уже загруженный глоссарий
+        if len(existing) > 1:
+            with ProcessPoolExecutor(initializer=_init_worker, initargs=(self.glossary,)) as executor:
+                all_metrics = list(executor.map(_analyze_in_worker, existing))
+        else:
+            all_metrics = [self.analyze_file(p) for p in existing]
+        
+        for file_path, metrics in zip(existing, all_metrics):
+            if metrics:
+                llm_name = self._extract_llm_name(file_path)
+                results[llm_name] = metrics
         
         # Создаем отчет
         self._generate_report(results, output_file)
@@ -110,80 +207,102 @@ class TranslationQualityComparator:
     
     def _extract_llm_name(self, file_path: str) -> str:
         """Извлечь название LLM из имени файла."""
-        filename = os.path.basename(file_path)
-        # Формат: Pintek_ch1_EN_gpt4.docx
-        if '_' in filename:
-            parts = filename.replace('.docx', '').split('_')
-            if len(parts) >= 4:
-                return parts[-1].upper()
+        # Формат: Pintek_ch1_EN_gpt4.docx - имя LLM после последнего '_'
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        if stem.count('_') >= 3:
+            return stem.rpartition('_')[2].upper()
         return "UNKNOWN"
     
     def _generate_report(self, results: Dict, output_file: str):
         """Создать детальный отчет."""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 70 + "\n")
-            f.write("ОТЧЕТ СРАВНЕНИЯ КАЧЕСТВА ПЕРЕВОДОВ\n")
-            f.write("=" * 70 + "\n\n")
+        # Собираем отчёт в памяти и записываем одним вызовом
+        buf = io.StringIO()
+        w = buf.write
+        
+        w("=" * 70 + "\n")
+        w("ОТЧЕТ СРАВНЕНИЯ КАЧЕСТВА ПЕРЕВОДОВ\n")
+        w("=" * 70 + "\n\n")
+        
+        for llm_name, metrics in sorted(results.items()):
+            w(f"\n{'='*70}\n")
+            w(f"LLM: {llm_name}\n")
+            w(f"{'='*70}\n\n")
             
-            for llm_name, metrics in sorted(results.items()):
-                f.write(f"\n{'='*70}\n")
-                f.write(f"LLM: {llm_name}\n")
-                f.write(f"{'='*70}\n\n")
-                
-                f.write(f"Файл: {metrics['file']}\n")
-                f.write(f"Параграфов: {metrics['paragraphs_count']}\n")
-                f.write(f"Всего символов: {metrics['total_chars']:,}\n\n")
-                
-                # Проверка глоссария
-                f.write("СООТВЕТСТВИЕ ГЛОССАРИЮ:\n")
-                f.write("-" * 70 + "\n")
-                f.write(f"Правильно использовано терминов: {metrics['glossary_compliance']}\n")
-                f.write(f"Нарушений глоссария: {len(metrics['glossary_violations'])}\n")
-                
-                if metrics['glossary_violations']:
-                    f.write("\nНайденные нарушения:\n")
-                    for violation in metrics['glossary_violations'][:10]:  # Первые 10
-                        f.write(f"  Параграф {violation['paragraph']}: '{violation['source']}' "
-                               f"должно быть '{violation['expected']}'\n")
-                        f.write(f"    Фрагмент: {violation['text_snippet']}\n\n")
-                
-                # Проверка на русский текст
-                f.write("\nПРОВЕРКА НА РУССКИЙ ТЕКСТ:\n")
-                f.write("-" * 70 + "\n")
-                if metrics['has_russian_text']:
-                    f.write(f"⚠ ВНИМАНИЕ: Найден русский текст в параграфах: {metrics['russian_paragraphs']}\n")
-                else:
-                    f.write("✓ Русский текст не найден\n")
-                
-                f.write("\n")
+            w(f"Файл: {metrics['file']}\n")
+            w(f"Параграфов: {metrics['paragraphs_count']}\n")
+            w(f"Всего символов: {metrics['total_chars']:,}\n\n")
             
-            # Сравнительная таблица
-            f.write("\n" + "=" * 70 + "\n")
-            f.write("СРАВНИТЕЛЬНАЯ ТАБЛИЦА\n")
-            f.write("=" * 70 + "\n\n")
-            f.write(f"{'LLM':<15} {'Параграфов':<12} {'Глоссарий':<15} {'Русский текст':<15}\n")
-            f.write("-" * 70 + "\n")
+            # Проверка глоссария
+            w("СООТВЕТСТВИЕ ГЛОССАРИЮ:\n")
+            w("-" * 70 + "\n")
+            w(f"Правильно использовано терминов: {metrics['glossary_compliance']}\n")
+            w(f"Нарушений глоссария: {len(metrics['glossary_violations'])}\n")
             
-            for llm_name, metrics in sorted(results.items()):
-                glossary_status = f"{metrics['glossary_compliance']}✓/{len(metrics['glossary_violations'])}✗"
-                russian_status = "✗ ЕСТЬ" if metrics['has_russian_text'] else "✓ НЕТ"
-                f.write(f"{llm_name:<15} {metrics['paragraphs_count']:<12} {glossary_status:<15} {russian_status:<15}\n")
+            if metrics['glossary_violations']:
+                w("\nНайденные нарушения:\n")
+                for violation in metrics['glossary_violations'][:10]:  # Первые 10
+                    w(f"  Параграф {violation['paragraph']}: '{violation['source']}' "
+                      f"должно быть '{violation['expected']}'\n")
+                    w(f"    Фрагмент: {violation['text_snippet']}\n\n")
+            
+            # Проверка на русский текст
+            w("\nПРОВЕРКА НА РУССКИЙ ТЕКСТ:\n")
+            w("-" * 70 + "\n")
+            if metrics['has_russian_text']:
+                w(f"⚠ ВНИМАНИЕ: Найден русский текст в параграфах: {metrics['russian_paragraphs']}\n")
+            else:
+                w("✓ Русский текст не найден\n")
+            
+            w("\n")
+        
+        # Сравнительная таблица
+        w("\n" + "=" * 70 + "\n")
+        w("СРАВНИТЕЛЬНАЯ ТАБЛИЦА\n")
+        w("=" * 70 + "\n\n")
+        w(f"{'LLM':<15} {'Параграфов':<12} {'Глоссарий':<15} {'Русский текст':<15}\n")
+        w("-" * 70 + "\n")
+        
+        for llm_name, metrics in sorted(results.items()):
+            glossary_status = f"{metrics['glossary_compliance']}✓/{len(metrics['glossary_violations'])}✗"
+            russian_status = "✗ ЕСТЬ" if metrics['has_russian_text'] else "✓ НЕТ"
+            w(f"{llm_name:<15} {metrics['paragraphs_count']:<12} {glossary_status:<15} {russian_status:<15}\n")
+        
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(buf.getvalue())
         
         print(f"\n✓ Детальный отчет сохранен в {output_file}")
     
     def _print_summary(self, results: Dict):
         """Вывести краткую сводку в консоль."""
-        print("\n" + "=" * 70)
-        print("КРАТКАЯ СВОДКА")
-        print("=" * 70)
-        
-        print(f"\n{'LLM':<15} {'Параграфов':<12} {'Глоссарий':<15} {'Русский текст':<15}")
-        print("-" * 70)
+        lines = [
+            "\n" + "=" * 70,
+            "КРАТКАЯ СВОДКА",
+            "=" * 70,
+            f"\n{'LLM':<15} {'Параграфов':<12} {'Глоссарий':<15} {'Русский текст':<15}",
+            "-" * 70,
+        ]
         
         for llm_name, metrics in sorted(results.items()):
             glossary_status = f"{metrics['glossary_compliance']}✓/{len(metrics['glossary_violations'])}✗"
             russian_status = "✗ ЕСТЬ" if metrics['has_russian_text'] else "✓ НЕТ"
-            print(f"{llm_name:<15} {metrics['paragraphs_count']:<12} {glossary_status:<15} {russian_status:<15}")
+            lines.append(f"{llm_name:<15} {metrics['paragraphs_count']:<12} {glossary_status:<15} {russian_status:<15}")
+        
+        print("\n".join(lines))
+
+
+# Экземпляр анализатора в процессе-воркере compare_files
+_worker_comparator: Optional[TranslationQualityComparator] = None
+
+
+def _init_worker(glossary: Dict[str, str]):
+    """Создать анализатор в процессе-воркере один раз."""
+    global _worker_comparator
+    _worker_comparator = TranslationQualityComparator(glossary=glossary)
+
+
+def _analyze_in_worker(file_path: str) -> Dict:
+    """Проанализировать файл в процессе-воркере."""
+    return _worker_comparator.analyze_file(file_path)
 
 
 def main():
@@ -203,8 +322,9 @@ if __name__ == "__main__":
     # Автоматический поиск файлов для сравнения
     output_dir = "Output"
     if os.path.exists(output_dir):
-        files = [os.path.join(output_dir, f) for f in os.listdir(output_dir) 
-                if f.startswith("Pintek_ch1_EN_") and f.endswith(".docx")]
+        with os.scandir(output_dir) as entries:
+            files = [e.path for e in entries
+                     if e.name.startswith("Pintek_ch1_EN_") and e.name.endswith(".docx") and e.is_file()]
         
         if files:
             print(f"Найдено файлов для сравнения: {len(files)}")
@@ -29,6 +29,15 @@ DEFAULT_LLM_ENGINE = os.getenv("DEFAULT_LLM_ENGINE", "gpt4")  # gpt4, claude, de
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "4000"))
 
+# Модели LLM редакторов (например, gpt-4o-mini или claude-3-5-haiku для дешёвых прогонов)
+MODELS = {
+    "gpt4": os.getenv("OPENAI_MODEL", "gpt-4o"),
+    "claude": os.getenv("ANTHROPIC_MODEL", "claude-3-5-sonnet-20241022"),
+    "deepseek": os.getenv("DEEPSEEK_MODEL", "deepseek-chat"),
+    "crok": os.getenv("CROK_MODEL", "crok-ai"),
+    "grok": os.getenv("GROK_MODEL", "grok-3"),
+}
+
 # Пути
 INPUT_DIR = "Input"
 OUTPUT_DIR = "Output"
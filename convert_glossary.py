@@ -2,10 +2,11 @@
 Утилита для конвертации глоссария из формата ChatGPT в формат системы.
 """
 
-import json
 import sys
 import os
 
+import json_io
+
 
 def convert_chatgpt_glossary(input_file: str, output_file: str = "glossary.json"):
     """
@@ -24,7 +25,7 @@ def convert_chatgpt_glossary(input_file: str, output_file: str = "glossary.json"
             content = content.strip()
             if content.startswith('\ufeff'):
                 content = content[1:]
-            data = json.loads(content)
+            data = json_io.loads(content)
         
         # Конвертируем в простой формат
         converted = {}
@@ -44,8 +45,7 @@ def convert_chatgpt_glossary(input_file: str, output_file: str = "glossary.json"
             converted = data
         
         # Сохраняем конвертированный глоссарий
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(converted, f, ensure_ascii=False, indent=2)
+        json_io.dump(converted, output_file)
         
         print(f"✓ Конвертировано {len(converted)} записей")
         print(f"✓ Сохранено в {output_file}")
@@ -3,8 +3,81 @@
 """
 
 from docx import Document
-from typing import List, Optional
+from functools import lru_cache
+from lxml import etree
+from typing import Iterable, List, Optional, Tuple
 import os
+import zipfile
+
+
+# Пространство имён WordprocessingML
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+# Текстовые эквиваленты служебных элементов внутри w:r (как в python-docx)
+_RUN_SPECIAL = {_W + 'tab': '\t', _W + 'ptab': '\t', _W + 'cr': '\n', _W + 'noBreakHyphen': '-'}
+
+
+def _run_text(run) -> str:
+    """Текст элемента w:r."""
+    parts = []
+    for e in run:
+        if e.tag == _W + 't':
+            parts.append(e.text or '')
+        elif e.tag == _W + 'br':
+            # Разрывы страницы/колонки текста не дают, переносы строки - '\n'
+            if e.get(_W + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif e.tag in _RUN_SPECIAL:
+            parts.append(_RUN_SPECIAL[e.tag])
+    return ''.join(parts)
+
+
+def _paragraph_text(p) -> str:
+    """Текст элемента w:p: прямые w:r и w:r внутри w:hyperlink."""
+    parts = []
+    for child in p:
+        if child.tag == _W + 'r':
+            parts.append(_run_text(child))
+        elif child.tag == _W + 'hyperlink':
+            parts.extend(_run_text(r) for r in child.iterchildren(_W + 'r'))
+    return ''.join(parts)
+
+
+def _iter_body_paragraphs(file_path: str):
+    """
+    Потоково перебрать тексты параграфов тела документа.
+    
+    Разбирает word/document.xml через iterparse, не строя полный DOM
+    python-docx, и освобождает уже обработанные элементы. Как и
+    Document.paragraphs, учитывает только параграфы верхнего уровня w:body.
+    """
+    with zipfile.ZipFile(file_path) as z, z.open('word/document.xml') as f:
+        for _, el in etree.iterparse(f, events=('end',)):
+            parent = el.getparent()
+            if parent is None or parent.tag != _W + 'body':
+                continue
+            if el.tag == _W + 'p':
+                yield _paragraph_text(el)
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+
+
+@lru_cache(maxsize=64)
+def _read_paragraphs(file_path: str, mtime_ns: int, size: int) -> Tuple[str, ...]:
+    """
+    Прочитать непустые параграфы .docx файла.
+    
+    Кешируется по (путь, время изменения, размер): повторное чтение
+    неизменённого файла не разбирает документ заново.
+    """
+    try:
+        texts = list(_iter_body_paragraphs(file_path))
+    except KeyError:
+        # Нестандартный пакет без word/document.xml - читаем через python-docx
+        texts = [para.text for para in Document(file_path).paragraphs]
+    
+    # Пропускаем пустые параграфы
+    return tuple(text.strip() for text in texts if text.strip())
 
 
 class DocxHandler:
@@ -21,38 +94,38 @@ class DocxHandler:
         Returns:
             Список строк (параграфов)
         """
-        if not os.path.exists(file_path):
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
             raise FileNotFoundError(f"Файл не найден: {file_path}")
         
-        doc = Document(file_path)
-        paragraphs = []
-        
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if text:  # Пропускаем пустые параграфы
-                paragraphs.append(text)
-        
-        return paragraphs
+        # Кеш хранит кортеж; возвращаем копию-список, которую можно менять
+        return list(_read_paragraphs(os.path.abspath(file_path), st.st_mtime_ns, st.st_size))
     
     @staticmethod
-    def write_docx(file_path: str, paragraphs: List[str], source_docx: Optional[str] = None):
+    def write_docx(file_path: str, paragraphs: Iterable[str], source_docx: Optional[str] = None):
         """
-        Записывает список параграфов в .docx файл.
+        Записывает параграфы в .docx файл.
         
         Args:
             file_path: Путь для сохранения файла
-            paragraphs: Список строк (параграфов)
+            paragraphs: Строки параграфов (список или итератор - читаются один раз)
             source_docx: Опциональный исходный файл для копирования форматирования
         """
         if source_docx and os.path.exists(source_docx):
             doc = Document(source_docx)
-            # Очищаем содержимое, но сохраняем стили
-            doc.paragraphs.clear()
+            # Очищаем содержимое, но сохраняем стили. doc.paragraphs - это
+            # новый список при каждом обращении, поэтому удаляем элементы
+            # прямо из w:body, оставляя w:sectPr (параметры страницы)
+            body = doc.element.body
+            for child in list(body):
+                if child.tag != _W + 'sectPr':
+                    body.remove(child)
         else:
             doc = Document()
         
         for para_text in paragraphs:
-            para = doc.add_paragraph(para_text)
+            doc.add_paragraph(para_text)
         
         # Создаем директорию, если её нет
         os.makedirs(os.path.dirname(file_path) if os.path.dirname(file_path) else '.', exist_ok=True)
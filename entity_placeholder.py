@@ -10,8 +10,17 @@
 """
 
 import re
-import json
-from typing import Dict, List, Tuple, Optional
+import json_io
+from typing import Dict, List, Tuple, Optional, Pattern
+
+# Плейсхолдер сущности в тексте: __ENT_<номер>__
+_PLACEHOLDER_RE = re.compile(r'__ENT_\d+__')
+
+# Окончания падежных форм (родительный, дательный, творительный, предложный...)
+_SUFFIXES_EM = ('ёма', 'ема', 'ёму', 'ему', 'ёмом', 'емом', 'ёме', 'еме')  # Артём
+_SUFFIXES_YA = ('и', 'е', 'ей', 'ю')  # Катя
+_SUFFIXES_A = ('ы', 'е', 'ой', 'у')  # Флютка
+_SUFFIXES_EK = ('а', 'у', 'ом', 'е')  # Пинтек
 
 
 class EntityPlaceholder:
@@ -28,13 +37,18 @@ class EntityPlaceholder:
         self.glossary_file = glossary_file
         self.entities: Dict[str, Dict] = {}  # source -> {target, type, ...}
         self.source_forms: Dict[str, str] = {}  # форма -> базовая форма
+        # Единый паттерн по всем формам всех сущностей (строится в _build_matcher)
+        self._pattern: Optional[Pattern] = None
+        self._exact_forms: Dict[str, str] = {}  # форма (с учётом регистра) -> сущность
+        self._lower_forms: Dict[str, str] = {}  # форма в нижнем регистре -> сущность
+        # Первые буквы всех форм: текст без них паттерн не проверяет
+        self._first_chars: frozenset = frozenset()
         self.load_glossary()
     
     def load_glossary(self):
         """Загрузить глоссарий и извлечь сущности."""
         try:
-            with open(self.glossary_file, 'r', encoding='utf-8') as f:
-                glossary_data = json.load(f)
+            glossary_data = json_io.load_cached(self.glossary_file)
             
             for entry in glossary_data:
                 source = entry.get('source', '')
@@ -52,6 +66,7 @@ class EntityPlaceholder:
                     # Добавляем возможные формы склонений для русских имён
                     self._add_russian_forms(source, target)
             
+            self._build_matcher()
             print(f"✓ Загружено {len(self.entities)} сущностей для placeholder")
             
         except FileNotFoundError:
@@ -71,32 +86,61 @@ class EntityPlaceholder:
         # (это упрощённый подход, более точный требует pymorphy2)
         if source.endswith('ём') or source.endswith('ем'):
             # Артём -> Артёма, Артёму, Артёмом
-            base = source[:-2]
-            forms = [
-                base + 'ёма', base + 'ема',  # родительный
-                base + 'ёму', base + 'ему',  # дательный
-                base + 'ёмом', base + 'емом',  # творительный
-                base + 'ёме', base + 'еме',  # предложный
-            ]
-            for form in forms:
-                self.source_forms[form.lower()] = source
-        
-        elif source.endswith('а') or source.endswith('я'):
+            base, suffixes = source[:-2], _SUFFIXES_EM
+        elif source.endswith('я'):
             # Катя -> Кати, Кате, Катей, Катю
-            base = source[:-1]
-            suffix = source[-1]
-            if suffix == 'я':
-                forms = [base + 'и', base + 'е', base + 'ей', base + 'ю']
-            else:
-                forms = [base + 'ы', base + 'е', base + 'ой', base + 'у']
-            for form in forms:
-                self.source_forms[form.lower()] = source
-        
+            base, suffixes = source[:-1], _SUFFIXES_YA
+        elif source.endswith('а'):
+            base, suffixes = source[:-1], _SUFFIXES_A
         elif source.endswith('ек') or source.endswith('ик'):
             # Пинтек -> Пинтека, Пинтеку
-            forms = [source + 'а', source + 'у', source + 'ом', source + 'е']
-            for form in forms:
-                self.source_forms[form.lower()] = source
+            base, suffixes = source, _SUFFIXES_EK
+        else:
+            return
+        
+        # Окончания уже в нижнем регистре - приводим к нему только основу
+        base_lower = base.lower()
+        for suffix in suffixes:
+            self.source_forms[base_lower + suffix] = source
+    
+    def _build_matcher(self):
+        """
+        Собрать все формы всех сущностей в один паттерн-альтернацию,
+        чтобы размечать текст за один проход.
+        """
+        # Обратный индекс: сущность -> её падежные формы
+        forms_by_base: Dict[str, List[str]] = {}
+        for form, base in self.source_forms.items():
+            forms_by_base.setdefault(base, []).append(form)
+        
+        alternatives = []
+        self._exact_forms = {}
+        self._lower_forms = {}
+        first_chars = set()
+        
+        # Длинные сущности первыми: при совпадении формы побеждает более длинная
+        for source in sorted(self.entities, key=len, reverse=True):
+            case_sensitive = self.entities[source].get('case_sensitive', True)
+            for form in {source, *forms_by_base.get(source, ())}:
+                if not form:
+                    continue
+                if case_sensitive:
+                    self._exact_forms.setdefault(form, source)
+                    alternatives.append((form, re.escape(form)))
+                    first_chars.add(form[0])
+                else:
+                    self._lower_forms.setdefault(form.lower(), source)
+                    alternatives.append((form, '(?i:' + re.escape(form) + ')'))
+                    first_chars.update((form[0].lower(), form[0].upper()))
+        self._first_chars = frozenset(first_chars)
+        
+        if not alternatives:
+            self._pattern = None
+            return
+        
+        # Альтернация пробует варианты слева направо - длинные формы первыми
+        alternatives.sort(key=lambda x: len(x[0]), reverse=True)
+        self._pattern = re.compile(r'\b(?:' + '|'.join(alt for _, alt in alternatives) + r')\b')
     
     def mark_entities(self, text: str) -> Tuple[str, Dict[str, str]]:
         """
@@ -109,45 +153,29 @@ class EntityPlaceholder:
             (текст с плейсхолдерами, словарь placeholder -> (source, target))
         """
         mapping = {}
-        result = text
-        idx = 0
+        # Ни одной первой буквы сущностей - обычный случай для реплик без имён
+        if self._pattern is None or self._first_chars.isdisjoint(text):
+            return text, mapping
         
-        # Сортируем по длине (от длинных к коротким) для корректной замены
-        sorted_entities = sorted(self.entities.keys(), key=len, reverse=True)
+        # Локальные ссылки вместо атрибутов self в горячем callback
+        exact_forms = self._exact_forms.get
+        lower_forms = self._lower_forms.get
+        entities = self.entities
         
-        for source in sorted_entities:
-            entity_info = self.entities[source]
-            target = entity_info['target']
-            case_sensitive = entity_info.get('case_sensitive', True)
-            
-            # Создаём паттерн для поиска всех форм
-            forms_to_find = [source]
-            for form, base in self.source_forms.items():
-                if base == source:
-                    forms_to_find.append(form)
-            
-            # Удаляем дубликаты и сортируем по длине
-            forms_to_find = sorted(set(forms_to_find), key=len, reverse=True)
-            
-            for form in forms_to_find:
-                flags = 0 if case_sensitive else re.IGNORECASE
-                pattern = re.compile(r'\b' + re.escape(form) + r'\b', flags)
-                
-                def replace_func(match):
-                    nonlocal idx
-                    original = match.group(0)
-                    placeholder = f"__ENT_{idx}__"
-                    mapping[placeholder] = {
-                        'original': original,
-                        'source': source,
-                        'target': target
-                    }
-                    idx += 1
-                    return placeholder
-                
-                result = pattern.sub(replace_func, result)
+        def replace_func(match):
+            original = match.group(0)
+            source = exact_forms(original) or lower_forms(original.lower())
+            if source is None:
+                return original
+            placeholder = f"__ENT_{len(mapping)}__"
+            mapping[placeholder] = {
+                'original': original,
+                'source': source,
+                'target': entities[source]['target']
+            }
+            return placeholder
         
-        return result, mapping
+        return self._pattern.sub(replace_func, text), mapping
     
     def restore_entities(self, text: str, mapping: Dict[str, Dict]) -> str:
         """
@@ -160,19 +188,20 @@ class EntityPlaceholder:
         Returns:
             Текст с восстановленными сущностями
         """
-        result = text
+        def replace_func(match):
+            info = mapping.get(match.group(0))
+            if info is None:
+                return match.group(0)
+            return self._restore_case(info['target'], info['original'])
         
-        for placeholder, info in mapping.items():
-            target = info['target']
-            original = info['original']
-            
-            # Проверяем регистр оригинала для сохранения капитализации
-            if original[0].isupper():
-                target = target[0].upper() + target[1:] if len(target) > 1 else target.upper()
-            
-            result = result.replace(placeholder, target)
-        
-        return result
+        return _PLACEHOLDER_RE.sub(replace_func, text)
+    
+    @staticmethod
+    def _restore_case(target: str, original: str) -> str:
+        """Сохранить капитализацию оригинала в целевой форме."""
+        if original[0].isupper():
+            return target[0].upper() + target[1:] if len(target) > 1 else target.upper()
+        return target
     
     def process_text(self, text: str) -> Tuple[str, Dict]:
         """
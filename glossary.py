@@ -3,9 +3,19 @@
 Глоссарий обеспечивает консистентность перевода имен, терминов и фраз.
 """
 
-import json
 import os
-from typing import Dict, Optional
+import re
+from typing import Callable, Dict, Optional
+
+import json_io
+
+# Aho–Corasick заменяет термины за один проход независимо от размера глоссария;
+# без pyahocorasick - одно регулярное выражение на все термины
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 
 class Glossary:
@@ -14,14 +24,18 @@ class Glossary:
     def __init__(self, glossary_file: str = "glossary.json"):
         self.glossary_file = glossary_file
         self.glossary: Dict[str, str] = {}
+        # Функция замены под текущий глоссарий, строится лениво в apply()
+        self._matcher: Optional[Callable[[str], str]] = None
+        # Есть несохранённые изменения (add с flush=False)
+        self._dirty = False
         self.load()
     
     def load(self):
         """Загрузить глоссарий из файла."""
+        self._matcher = None
         if os.path.exists(self.glossary_file):
             try:
-                with open(self.glossary_file, 'r', encoding='utf-8') as f:
-                    self.glossary = json.load(f)
+                self.glossary = json_io.load(self.glossary_file)
             except Exception as e:
                 print(f"Ошибка загрузки глоссария: {e}")
                 self.glossary = {}
@@ -31,34 +45,124 @@ class Glossary:
     
     def save(self):
         """Сохранить глоссарий в файл."""
+        # save() вызывается после любого изменения словаря - сбрасываем функцию замены
+        self._matcher = None
+        self._dirty = False
         try:
-            with open(self.glossary_file, 'w', encoding='utf-8') as f:
-                json.dump(self.glossary, f, ensure_ascii=False, indent=2)
+            json_io.dump(self.glossary, self.glossary_file)
         except Exception as e:
             print(f"Ошибка сохранения глоссария: {e}")
     
-    def add(self, source: str, target: str):
-        """Добавить или обновить запись в глоссарии."""
+    def add(self, source: str, target: str, flush: bool = True):
+        """
+        Добавить или обновить запись в глоссарии.
+        
+        Args:
+            source: Исходный термин
+            target: Перевод
+            flush: Сразу сохранить файл; при False запись сохранится
+                   в flush() или при выходе из блока with
+        """
         self.glossary[source.lower()] = target
+        if flush:
+            self.save()
+        else:
+            self._matcher = None
+            self._dirty = True
+    
+    def add_many(self, items: Dict[str, str]):
+        """Добавить несколько записей и сохранить файл один раз."""
+        self.glossary.update({source.lower(): target for source, target in items.items()})
         self.save()
     
+    def flush(self):
+        """Сохранить несохранённые изменения."""
+        if self._dirty:
+            self.save()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+    
     def get(self, source: str) -> Optional[str]:
         """Получить перевод из глоссария."""
         return self.glossary.get(source.lower())
     
-    def apply(self, text: str) -> str:
-        """Применить глоссарий к тексту (заменить термины)."""
-        result = text
-        # Сортируем по длине (от длинных к коротким), чтобы избежать частичных замен
-        sorted_items = sorted(self.glossary.items(), key=lambda x: len(x[0]), reverse=True)
+    def _compile(self) -> Callable[[str], str]:
+        """
+        Построить функцию замены, специализированную под текущий глоссарий.
+        
+        Все термины собираются в один автомат Aho–Corasick (или паттерн),
+        чтобы заменять за один проход.
+        Паттерны и таблица замен захватываются замыканием как локальные
+        переменные, поэтому в горячем пути нет обращений к атрибутам self.
+        """
+        # Сортируем по длине (от длинных к коротким), чтобы избежать частичных замен:
+        # альтернация пробует варианты слева направо
+        terms = sorted((s for s in self.glossary if s), key=len, reverse=True)
+        if not terms:
+            return lambda text: text
+        
+        sub = re.compile('|'.join(map(re.escape, terms)), re.IGNORECASE).sub
+        # Класс символов из первых букв терминов - быстрый префильтр
+        has_first_char = re.compile(
+            '[' + ''.join(sorted({re.escape(t[0]) for t in terms})) + ']', re.IGNORECASE
+        ).search
+        lookup = {source.lower(): target for source, target in self.glossary.items()}.get
+        
+        matches = None
+        if AHOCORASICK_AVAILABLE:
+            automaton = ahocorasick.Automaton()
+            for term in terms:
+                automaton.add_word(term.lower(), len(term.lower()))
+            automaton.make_automaton()
+            matches = automaton.iter
         
-        for source, target in sorted_items:
-            # Заменяем с учетом регистра
-            import re
-            pattern = re.compile(re.escape(source), re.IGNORECASE)
-            result = pattern.sub(target, result)
+        def replace(match):
+            term = match.group(0)
+            return lookup(term.lower(), term)
         
-        return result
+        def apply(text: str) -> str:
+            # В тексте нет ни одной первой буквы терминов - заменять нечего.
+            # Типичный случай: английский текст против русских терминов
+            if not has_first_char(text):
+                return text
+            text_lower = text.lower()
+            # Смещения в нижнем регистре совпадают с исходными, только если
+            # lower() не меняет длину (не меняет почти никогда)
+            if matches is None or len(text_lower) != len(text):
+                return sub(replace, text)
+            
+            # Как у регулярного выражения: самое левое вхождение, из начинающихся
+            # в одной позиции - самое длинное, без пересечений
+            longest: Dict[int, int] = {}
+            for end, length in matches(text_lower):
+                start = end - length + 1
+                if length > longest.get(start, 0):
+                    longest[start] = length
+            if not longest:
+                return text
+            parts = []
+            position = 0
+            for start in sorted(longest):
+                if start < position:
+                    continue
+                end = start + longest[start]
+                parts.append(text[position:start])
+                parts.append(lookup(text_lower[start:end], text[start:end]))
+                position = end
+            parts.append(text[position:])
+            return ''.join(parts)
+        
+        return apply
+    
+    def apply(self, text: str) -> str:
+        """Применить глоссарий к тексту (заменить термины)."""
+        if self._matcher is None:
+            self._matcher = self._compile()
+        return self._matcher(text)
     
     def get_all(self) -> Dict[str, str]:
         """Получить весь глоссарий."""
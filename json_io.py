@@ -0,0 +1,76 @@
+"""
+Модуль для быстрого чтения и записи JSON.
+
+Использует orjson (C-расширение, в разы быстрее stdlib), если он установлен,
+иначе - стандартный модуль json. Формат файлов одинаковый: UTF-8 без
+экранирования кириллицы, отступ 2 пробела.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Any, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Разобрать JSON из строки или байтов."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = True) -> bytes:
+    """
+    Сериализовать объект в JSON.
+
+    Args:
+        obj: Объект для сериализации
+        indent: Форматировать с отступом в 2 пробела; иначе - компактно
+
+    Returns:
+        JSON в кодировке UTF-8
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    # Без отступа - и без пробелов после разделителей, как у orjson
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def load(file_path: str) -> Any:
+    """Загрузить JSON из файла."""
+    with open(file_path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump(obj: Any, file_path: str, indent: bool = True):
+    """Сохранить объект в JSON файл."""
+    data = dumps(obj, indent=indent)
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+
+@lru_cache(maxsize=32)
+def _load_version(file_path: str, mtime_ns: int, size: int) -> Any:
+    """Разобрать файл один раз на каждую версию (время изменения и размер)."""
+    return load(file_path)
+
+
+def load_cached(file_path: str) -> Any:
+    """
+    Загрузить JSON из файла, разбирая его заново только после изменения.
+
+    Результат общий для всех вызывающих - его нельзя изменять.
+    """
+    stat = os.stat(file_path)
+    return _load_version(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,159 @@
+"""
+Модуль для кеширования ответов LLM пост-редакторов.
+
+Преимущества:
+- Повторные запуски и возобновлённые переводы не обращаются к API
+- Экономия токенов на повторяющихся параграфах
+- Консистентность результатов
+
+Хранилище - SQLite: запись одного ответа не требует перезаписи всего файла.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class LLMCache:
+    """
+    Кеш ответов LLM.
+    Хранит ответы по хешу (редактор, модель, системный промпт, промпт).
+    """
+
+    def __init__(self, cache_file: str = "llm_cache.db"):
+        """
+        Args:
+            cache_file: Путь к файлу базы кеша
+        """
+        self.cache_file = cache_file
+        self.hits = 0  # Счётчик попаданий в кеш
+        self.misses = 0  # Счётчик промахов
+        # Кеш общий для всех редакторов в процессе (get_llm_cache),
+        # поэтому соединение разделяем между потоками под блокировкой
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, editor TEXT, model TEXT, response TEXT, timestamp TEXT)"
+        )
+        self._conn.commit()
+
+    def _make_key(self, editor: str, model: str, system_prompt: str, prompt: str) -> str:
+        """
+        Создать ключ кеша на основе хеша промпта и параметров.
+
+        Args:
+            editor: Название класса редактора
+            model: Название модели
+            system_prompt: Системный промпт
+            prompt: Промпт пользователя
+
+        Returns:
+            SHA256 хеш
+        """
+        # \x00 разделяет поля, чтобы разные наборы полей не давали одну строку
+        cache_string = "\x00".join((editor, model, system_prompt, prompt))
+        return hashlib.sha256(cache_string.encode('utf-8')).hexdigest()
+
+    def get(self, editor: str, model: str, system_prompt: str, prompt: str) -> Optional[str]:
+        """
+        Получить ответ LLM из кеша.
+
+        Returns:
+            Ответ LLM или None
+        """
+        key = self._make_key(editor, model, system_prompt, prompt)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None:
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, editor: str, model: str, system_prompt: str, prompt: str, response: str):
+        """
+        Сохранить ответ LLM в кеш.
+
+        Args:
+            editor: Название класса редактора
+            model: Название модели
+            system_prompt: Системный промпт
+            prompt: Промпт пользователя
+            response: Ответ LLM
+        """
+        key = self._make_key(editor, model, system_prompt, prompt)
+
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, editor, model, response, datetime.now().isoformat())
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Ошибка сохранения LLM кеша: {e}")
+
+    def clear(self):
+        """Очистить весь кеш."""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+        print("✓ LLM кеш очищен")
+
+    def get_stats(self) -> Dict:
+        """Получить статистику использования кеша."""
+        with self._lock:
+            total_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total > 0 else 0
+
+        return {
+            'total_entries': total_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f"{hit_rate:.1f}%"
+        }
+
+    def close(self):
+        """Закрыть соединение с базой."""
+        with self._lock:
+            self._conn.close()
+
+
+# Глобальный экземпляр кеша
+_llm_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Получить глобальный экземпляр LLM кеша."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMCache()
+    return _llm_cache
+
+
+# Тестирование модуля
+if __name__ == "__main__":
+    cache = LLMCache("test_llm_cache.db")
+
+    cache.set("GPT4PostEditor", "gpt-4o", "system", "Привет, мир!", "Hello, world!")
+
+    result = cache.get("GPT4PostEditor", "gpt-4o", "system", "Привет, мир!")
+    print(f"Результат из кеша: {result}")
+
+    print(f"Статистика: {cache.get_stats()}")
+
+    cache.close()
+    os.remove("test_llm_cache.db")
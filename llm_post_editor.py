@@ -2,25 +2,63 @@
 Модуль для пост-редактирования перевода через LLM.
 """
 
-from typing import Optional
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
+from tenacity import (before_sleep_log, retry, retry_if_exception,
+                      stop_after_attempt, wait_exponential_jitter)
 import config
+from llm_cache import LLMCache
+from rate_limiter import RateLimiter
 
+# SDK провайдеров импортируются один раз; отсутствие нужного SDK
+# сообщается при создании соответствующего редактора
+try:
+    from openai import OpenAI
+except ImportError:
+    OpenAI = None
 
-class LLMPostEditor:
-    """Базовый класс для LLM пост-редакторов."""
-    
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
-        """Пост-редактировать перевод."""
-        raise NotImplementedError
-    
-    def _create_prompt(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
-        """Создать промпт для пост-редактирования детской литературы (7-12 лет)."""
-        glossary_text = ""
-        if glossary:
-            glossary_items = "\n".join([f"- {k} → {v}" for k, v in glossary.items()])
-            glossary_text = f"\n\n**GLOSSARY (MUST USE EXACTLY):**\n{glossary_items}"
-        
-        prompt = f"""You are an expert editor of American children's fiction (ages 7-12). Your task is to post-edit a machine-translated Russian children's book to make it sound natural, engaging, and native-like for young American readers.
+try:
+    from anthropic import Anthropic
+except ImportError:
+    Anthropic = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - нужен httpx для HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+# Тексты промптов собираются один раз при импорте; на каждый параграф
+# подставляются только оригинал, машинный перевод и глоссарий
+_SYSTEM_PROMPT = """You are an expert editor of American children's fiction (ages 7-12). 
+
+Your expertise includes:
+- Making text engaging and age-appropriate for young readers
+- Creating natural-sounding American English dialogue
+- Maintaining a playful, adventurous tone
+- Using short sentences and vivid descriptions
+- Preserving the magic and wonder of children's stories
+
+You ALWAYS use the exact glossary terms provided - never change character names or special terms.
+You NEVER add explanations or comments - only the edited text."""
+
+_INSTRUCTIONS = """You are an expert editor of American children's fiction (ages 7-12). Your task is to post-edit a machine-translated Russian children's book to make it sound natural, engaging, and native-like for young American readers.
 
 **TARGET AUDIENCE:** American children ages 7-12
 **STYLE:** Playful, engaging, easy to read, age-appropriate vocabulary
@@ -41,233 +79,526 @@ class LLMPostEditor:
 - Instead of "She felt very happy" → "Katie's heart leaped"
 - Instead of "It was a beautiful day" → "Sunshine sparkled everywhere"
 
-**ORIGINAL RUSSIAN TEXT:**
-{original_text}
+"""
+
+_PROMPT_HEAD = "**ORIGINAL RUSSIAN TEXT:**\n"
+_PROMPT_MID = "\n\n**MACHINE TRANSLATION TO IMPROVE:**\n"
+_PROMPT_TAIL = "\n\n**OUTPUT:** Return ONLY the improved English text. No explanations, no comments, no markdown formatting."
+_PROMPT_MARKERS = ("\n\n**PARAGRAPH MARKERS:** Each paragraph starts with a marker like ¶0§. "
+                   "Keep every marker exactly as is, once, in the same order, at the start of its paragraph.")
+
+# Маркер параграфа в батче: LLM может слить или разбить параграфы, а по
+# маркерам перевод всё равно делится на исходные параграфы
+_MARKER_RE = re.compile(r'[ \t]*¶(\d+)§[ \t]*')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+
+def mark_paragraphs(text: str) -> str:
+    """Пометить параграфы текста (разделённые пустой строкой) маркерами ¶N§."""
+    paragraphs = text.split('\n\n')
+    if len(paragraphs) < 2:
+        return text
+    return '\n\n'.join(f'¶{i}§ {paragraph}' for i, paragraph in enumerate(paragraphs))
+
+
+def unmark_paragraphs(text: str, count: int) -> str:
+    """
+    Снять маркеры ¶N§ с ответа LLM.
+    
+    Если все count маркеров на месте и по порядку, параграфы собираются
+    заново через пустую строку (пустые строки внутри параграфа схлопываются),
+    и перевод делится ровно на count параграфов. Иначе маркеры просто удаляются.
+    """
+    parts = _MARKER_RE.split(text)
+    if parts[1::2] == [str(i) for i in range(count)] and not parts[0].strip():
+        return '\n\n'.join(_BLANK_LINES_RE.sub('\n', body.strip()) for body in parts[2::2])
+    return '\n'.join(line.strip() for line in _MARKER_RE.sub(' ', text).split('\n')).strip()
+
+# Ограничители запросов по классам редакторов: лимиты действуют на весь процесс
+_rate_limiters: Dict[type, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+# HTTP статусы временных ошибок: лимит запросов и сбои на стороне провайдера
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_backoff = wait_exponential_jitter(initial=1, max=30)
 
-**MACHINE TRANSLATION TO IMPROVE:**
-{translated_text}
-{glossary_text}
 
-**OUTPUT:** Return ONLY the improved English text. No explanations, no comments, no markdown formatting."""
+@lru_cache(maxsize=1)
+def _shared_http_client():
+    """
+    Общий HTTP клиент всех редакторов (создаётся один раз).
+    
+    По HTTP/2 параллельные запросы к одному провайдеру мультиплексируются
+    в одном TLS соединении. Без h2 - HTTP/1.1 с общим пулом соединений.
+    """
+    if httpx is None:
+        return None
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=60.0
+    )
+
+
+@lru_cache(maxsize=1)
+def _tiktoken_encoding():
+    """Токенизатор OpenAI (создаётся один раз); None, если tiktoken недоступен."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception as e:
+        # Словарь BPE скачивается при первом использовании - без сети его нет
+        log.warning("tiktoken недоступен, токены оцениваются по длине: %s", e)
+        return None
+
+
+def _api_error(exc: BaseException) -> BaseException:
+    """Исходная ошибка SDK/requests (редакторы оборачивают её через raise ... from)."""
+    return exc.__cause__ or exc
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Временная ли ошибка API: 429/5xx, обрыв соединения или таймаут."""
+    exc = _api_error(exc)
+    status = getattr(exc, 'status_code', None)
+    if status is None:
+        # httpx.HTTPStatusError хранит статус в response
+        status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None:
+        return status in _RETRY_STATUSES
+    # openai/anthropic: APIConnectionError и его потомок APITimeoutError;
+    # httpx (Crok): TransportError - обрыв соединения и таймауты
+    if type(exc).__name__ in ('APIConnectionError', 'APITimeoutError'):
+        return True
+    return (httpx is not None and isinstance(exc, httpx.TransportError)) or isinstance(exc, OSError)
+
+
+def _wait_retry_after(retry_state) -> float:
+    """Пауза перед повтором: Retry-After от провайдера, иначе экспоненциальная с джиттером."""
+    exc = _api_error(retry_state.outcome.exception())
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return min(float(headers.get('retry-after')), 60.0)
+    except (TypeError, ValueError):
+        return _backoff(retry_state)
+
+
+class LLMPostEditor:
+    """Базовый класс для LLM пост-редакторов."""
+    
+    # Название модели (входит в ключ кеша ответов); по умолчанию из config.MODELS,
+    # экземпляр может переопределить через аргумент model
+    model: str = ""
+    # Кеш ответов LLM (LLMCache); None - каждый запрос идёт в API
+    cache: Optional[LLMCache] = None
+    # Семантический кеш (semantic_cache.SemanticCache); None - только точные совпадения
+    semantic_cache = None
+    # (глоссарий, готовая статичная часть промпта) последнего вызова
+    _instructions_cache = None
+    # Лимиты провайдера: (запросов в минуту, токенов в минуту, одновременных запросов)
+    rate_limits = (60, 100_000, 5)
+    # Контекстное окно модели в токенах (промпт + ответ)
+    context_window = 32_000
+    # Считать токены через tiktoken (OpenAI-совместимые модели); иначе - по длине
+    uses_tiktoken = True
+    
+    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+        """
+        Пост-редактировать перевод.
+        
+        Одинаковые запросы (редактор, модель, промпты) берутся из кеша без обращения к API,
+        почти совпадающие параграфы - из семантического кеша, если он подключён.
+        """
+        system_prompt = self._create_system_prompt()
+        instructions = self._create_instructions(glossary)
+        prompt = self._create_prompt(original_text, translated_text)
+        editor = type(self).__name__
+        full_prompt = instructions + prompt
+        
+        # Кеши проверяем до подсчёта токенов: на попадании BPE-кодирование
+        # промпта с глоссарием не нужно
+        if self.cache is not None:
+            cached = self.cache.get(editor, self.model, system_prompt, full_prompt)
+            if cached is not None:
+                return cached
+        
+        semantic = self.semantic_cache
+        if semantic is not None:
+            partition = semantic.make_partition(editor, self.model, system_prompt, instructions)
+            vector = semantic.embed(original_text, translated_text)
+            cached = semantic.get(partition, vector)
+            if cached is not None:
+                return cached
+        
+        # Запрос, не влезающий в контекст, API всё равно отклонит - делим
+        # параграфы пополам заранее, не тратя на это запрос
+        tokens = self._count_tokens(system_prompt) + self._count_tokens(full_prompt)
+        if tokens + config.LLM_MAX_TOKENS > self.context_window:
+            halves = self._split_halves(original_text, translated_text)
+            if halves is not None:
+                return "\n\n".join(
+                    self.post_edit(original, translated, glossary) for original, translated in halves
+                )
         
-        return prompt
+        result = self._request(system_prompt, instructions, prompt, tokens)
+        
+        if self.cache is not None:
+            self.cache.set(editor, self.model, system_prompt, full_prompt, result)
+        if semantic is not None:
+            semantic.set(partition, vector, result)
+        
+        return result
+    
+    def _count_tokens(self, text: str) -> int:
+        """Число токенов текста: tiktoken для OpenAI-совместимых моделей, иначе оценка."""
+        encoding = _tiktoken_encoding() if self.uses_tiktoken else None
+        if encoding is not None:
+            return len(encoding.encode(text))
+        # Грубая оценка: ~3 символа на токен для смеси кириллицы и латиницы
+        return len(text) // 3
+    
+    @staticmethod
+    def _split_halves(original_text: str, translated_text: str):
+        """
+        Разделить оригинал и перевод пополам по границе параграфов.
+        
+        Returns:
+            ((оригинал, перевод), (оригинал, перевод)) или None, если параграфы
+            не сопоставляются один к одному
+        """
+        originals = original_text.split('\n\n')
+        translations = translated_text.split('\n\n')
+        if len(originals) < 2 or len(originals) != len(translations):
+            return None
+        middle = len(originals) // 2
+        return (
+            ('\n\n'.join(originals[:middle]), '\n\n'.join(translations[:middle])),
+            ('\n\n'.join(originals[middle:]), '\n\n'.join(translations[middle:]))
+        )
+    
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Общий для всех экземпляров класса ограничитель запросов."""
+        cls = type(self)
+        with _rate_limiters_lock:
+            limiter = _rate_limiters.get(cls)
+            if limiter is None:
+                limiter = _rate_limiters[cls] = RateLimiter(*cls.rate_limits)
+            return limiter
+    
+    @retry(stop=stop_after_attempt(5), wait=_wait_retry_after,
+           retry=retry_if_exception(_is_retryable),
+           before_sleep=before_sleep_log(log, logging.WARNING), reraise=True)
+    def _request(self, system_prompt: str, instructions: str, prompt: str, tokens: int) -> str:
+        """
+        Запрос к API с учётом лимитов; временные ошибки повторяются с паузой.
+        
+        SDK клиенты созданы с max_retries=0: повторяет только этот декоратор,
+        и пауза между попытками не держит слот RateLimiter.
+        """
+        with self.rate_limiter.limit(tokens):
+            return self._complete(system_prompt, instructions, prompt)
+    
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
+        """
+        Отправить запрос в API модели и вернуть ответ.
+        
+        Args:
+            system_prompt: Системный промпт
+            instructions: Статичная часть (правила и глоссарий), одинаковая для всех параграфов
+            prompt: Параграф - оригинал и машинный перевод
+        """
+        raise NotImplementedError
+    
+    @staticmethod
+    def _chat_messages(system_prompt: str, instructions: str, prompt: str) -> list:
+        """
+        Сообщения для OpenAI-совместимого API.
+        
+        Статичная часть идёт первой: провайдеры с автоматическим кешированием
+        префикса (OpenAI, DeepSeek) не тарифицируют её повторно.
+        """
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": instructions + prompt}
+        ]
+    
+    def _stream_chat(self, system_prompt: str, instructions: str, prompt: str, **kwargs):
+        """
+        Запрос к OpenAI-совместимому API (self._client) в режиме стриминга.
+        
+        Ответ собирается по мере генерации: таймаут клиента действует на паузу
+        между фрагментами, а не на весь длинный ответ целиком.
+        
+        Returns:
+            (текст ответа, usage из последнего фрагмента или None)
+        """
+        stream = self._client.chat.completions.create(
+            model=self.model,
+            messages=self._chat_messages(system_prompt, instructions, prompt),
+            temperature=0.3,  # Низкая температура для консистентности
+            max_tokens=config.LLM_MAX_TOKENS,
+            stream=True,
+            **kwargs
+        )
+        
+        parts = []
+        usage = None
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+        return "".join(parts).strip(), usage
+    
+    def _create_instructions(self, glossary: dict = None) -> str:
+        """Создать статичную часть промпта для детской литературы (7-12 лет): правила и глоссарий."""
+        if not glossary:
+            return _INSTRUCTIONS
+        
+        # Глоссарий обычно одинаков для всей книги: форматируем его один раз.
+        # Сравнение словарей (на C) намного дешевле повторного форматирования
+        cached = self._instructions_cache
+        if cached is not None and (cached[0] is glossary or cached[0] == glossary):
+            return cached[1]
+        
+        glossary_items = "\n".join([f"- {k} → {v}" for k, v in glossary.items()])
+        instructions = f"{_INSTRUCTIONS}**GLOSSARY (MUST USE EXACTLY):**\n{glossary_items}\n\n"
+        # Храним копию: вызывающий код может изменить свой словарь
+        self._instructions_cache = (dict(glossary), instructions)
+        return instructions
+    
+    def _create_prompt(self, original_text: str, translated_text: str) -> str:
+        """Создать изменяемую часть промпта: оригинал и машинный перевод параграфа."""
+        markers = _PROMPT_MARKERS if _MARKER_RE.match(translated_text) else ""
+        return "".join((_PROMPT_HEAD, original_text, _PROMPT_MID, translated_text, markers, _PROMPT_TAIL))
     
     def _create_system_prompt(self) -> str:
         """Создать системный промпт для редактора детской литературы."""
-        return """You are an expert editor of American children's fiction (ages 7-12). 
-
-Your expertise includes:
-- Making text engaging and age-appropriate for young readers
-- Creating natural-sounding American English dialogue
-- Maintaining a playful, adventurous tone
-- Using short sentences and vivid descriptions
-- Preserving the magic and wonder of children's stories
-
-You ALWAYS use the exact glossary terms provided - never change character names or special terms.
-You NEVER add explanations or comments - only the edited text."""
+        return _SYSTEM_PROMPT
 
 
 class GPT4PostEditor(LLMPostEditor):
     """GPT-4 для пост-редактирования."""
     
-    def __init__(self, api_key: str):
+    model = config.MODELS["gpt4"]  # По умолчанию GPT-4o для лучшего качества
+    rate_limits = (60, 150_000, 10)
+    context_window = 128_000
+    
+    def __init__(self, api_key: str, model: Optional[str] = None):
         if not api_key:
             raise ValueError("OpenAI API ключ не указан")
         self.api_key = api_key
+        if model:
+            self.model = model
+        if OpenAI is None:
+            raise ImportError("Для GPT-4 установите openai: pip install openai")
+        # Клиент создаётся один раз: пул соединений переиспользуется между параграфами
+        self._client = OpenAI(api_key=api_key, timeout=60.0, max_retries=0,
+                              http_client=_shared_http_client())
     
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
         """Пост-редактировать через GPT-4."""
         try:
-            from openai import OpenAI
-            # Создаем клиент без дополнительных параметров для совместимости
-            client = OpenAI(api_key=self.api_key, timeout=60.0)
-            
-            prompt = self._create_prompt(original_text, translated_text, glossary)
-            system_prompt = self._create_system_prompt()
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Используем GPT-4o для лучшего качества
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Низкая температура для консистентности
-                max_tokens=config.LLM_MAX_TOKENS
-            )
-            
-            return response.choices[0].message.content.strip()
+            text, _ = self._stream_chat(system_prompt, instructions, prompt)
+            return text
         except Exception as e:
-            raise Exception(f"Ошибка пост-редактирования GPT-4: {e}")
+            raise Exception(f"Ошибка пост-редактирования GPT-4: {e}") from e
 
 
 class ClaudePostEditor(LLMPostEditor):
     """Claude (Anthropic) для пост-редактирования."""
     
-    def __init__(self, api_key: str):
+    model = config.MODELS["claude"]
+    rate_limits = (50, 80_000, 5)
+    context_window = 200_000
+    uses_tiktoken = False  # Токенизатор Anthropic не публичный
+    
+    def __init__(self, api_key: str, model: Optional[str] = None):
         if not api_key:
             raise ValueError("Anthropic API ключ не указан")
         self.api_key = api_key
+        if model:
+            self.model = model
+        if Anthropic is None:
+            raise ImportError("Для Claude установите anthropic: pip install anthropic")
+        self._client = Anthropic(api_key=api_key, max_retries=0)
     
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
         """Пост-редактировать через Claude."""
         try:
-            from anthropic import Anthropic
-            client = Anthropic(api_key=self.api_key)
-            
-            prompt = self._create_prompt(original_text, translated_text, glossary)
-            system_prompt = self._create_system_prompt()
-            
-            message = client.messages.create(
-                model="claude-3-5-sonnet-20241022",
+            # Стриминг: таймаут действует на паузу между фрагментами, а не на весь ответ
+            with self._client.messages.stream(
+                model=self.model,
                 max_tokens=config.LLM_MAX_TOKENS,
                 temperature=0.3,  # Низкая температура для консистентности
-                system=system_prompt,
+                # Системный промпт и правила с глоссарием одинаковы для всех параграфов:
+                # помечаем их для кеширования, в счёт идёт только параграф
+                system=[
+                    {"type": "text", "text": system_prompt},
+                    {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}}
+                ],
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
-            )
+            ) as stream:
+                text = "".join(stream.text_stream)
+                message = stream.get_final_message()
             
-            return message.content[0].text.strip()
+            log.debug("Claude: из кеша промпта %s токенов",
+                      getattr(message.usage, 'cache_read_input_tokens', None))
+            return text.strip()
         except Exception as e:
-            raise Exception(f"Ошибка пост-редактирования Claude: {e}")
+            raise Exception(f"Ошибка пост-редактирования Claude: {e}") from e
 
 
 class DeepSeekPostEditor(LLMPostEditor):
     """DeepSeek для пост-редактирования."""
     
-    def __init__(self, api_key: str):
+    model = config.MODELS["deepseek"]
+    rate_limits = (60, 100_000, 8)
+    context_window = 64_000
+    
+    def __init__(self, api_key: str, model: Optional[str] = None):
         if not api_key:
             raise ValueError("DeepSeek API ключ не указан")
         self.api_key = api_key
+        if model:
+            self.model = model
+        if OpenAI is None:
+            raise ImportError("Для DeepSeek установите openai: pip install openai")
+        # DeepSeek использует OpenAI-совместимый API
+        self._client = OpenAI(
+            api_key=api_key,
+            base_url="https://api.deepseek.com",
+            timeout=60.0,
+            max_retries=0,
+            http_client=_shared_http_client()
+        )
     
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
         """Пост-редактировать через DeepSeek."""
         try:
-            from openai import OpenAI
-            # DeepSeek использует OpenAI-совместимый API
-            client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://api.deepseek.com",
-                timeout=60.0
+            # include_usage: DeepSeek присылает usage последним фрагментом стрима
+            text, usage = self._stream_chat(
+                system_prompt, instructions, prompt,
+                extra_body={"stream_options": {"include_usage": True}}
             )
             
-            prompt = self._create_prompt(original_text, translated_text, glossary)
-            system_prompt = self._create_system_prompt()
-            
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Низкая температура для консистентности
-                max_tokens=config.LLM_MAX_TOKENS
-            )
-            
-            return response.choices[0].message.content.strip()
+            # DeepSeek кеширует общий префикс сообщений автоматически
+            log.debug("DeepSeek: из кеша промпта %s токенов",
+                      getattr(usage, 'prompt_cache_hit_tokens', None))
+            return text
         except Exception as e:
-            raise Exception(f"Ошибка пост-редактирования DeepSeek: {e}")
+            raise Exception(f"Ошибка пост-редактирования DeepSeek: {e}") from e
 
 
 class CrokPostEditor(LLMPostEditor):
     """Crok для пост-редактирования."""
     
-    def __init__(self, api_key: str):
+    model = config.MODELS["crok"]
+    
+    def __init__(self, api_key: str, model: Optional[str] = None):
         if not api_key:
             raise ValueError("Crok API ключ не указан")
         self.api_key = api_key
+        if model:
+            self.model = model
+        if httpx is None:
+            raise ImportError("Для Crok установите httpx: pip install httpx")
+        # Общий клиент держит соединения открытыми между запросами
+        # (повторы 429/5xx - в _request)
+        self._http = _shared_http_client()
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
     
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+    def _create_system_prompt(self) -> str:
+        """Системный промпт Crok."""
+        return "You are a professional literary translator specializing in Russian to American English translation."
+    
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
         """Пост-редактировать через Crok."""
         try:
-            import requests
-            
-            prompt = self._create_prompt(original_text, translated_text, glossary)
-            
             # Crok API endpoint (может потребоваться уточнение)
             url = "https://api.crok.ai/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
             data = {
-                "model": "crok-ai",
-                "messages": [
-                    {"role": "system", "content": "You are a professional literary translator specializing in Russian to American English translation."},
-                    {"role": "user", "content": prompt}
-                ],
+                "model": self.model,
+                "messages": self._chat_messages(system_prompt, instructions, prompt),
                 "temperature": config.LLM_TEMPERATURE,
                 "max_tokens": config.LLM_MAX_TOKENS
             }
             
-            response = requests.post(url, json=data, headers=headers)
+            response = self._http.post(url, json=data, headers=self._headers)
             response.raise_for_status()
             
             result = response.json()
             return result['choices'][0]['message']['content'].strip()
         except Exception as e:
-            raise Exception(f"Ошибка пост-редактирования Crok: {e}")
+            raise Exception(f"Ошибка пост-редактирования Crok: {e}") from e
 
 
 class GrokPostEditor(LLMPostEditor):
     """Grok (xAI) для пост-редактирования."""
     
-    def __init__(self, api_key: str):
+    model = config.MODELS["grok"]  # По умолчанию grok-3 (grok-beta deprecated)
+    rate_limits = (60, 100_000, 5)
+    context_window = 131_072
+    
+    def __init__(self, api_key: str, model: Optional[str] = None):
         if not api_key:
             raise ValueError("Grok API ключ не указан")
         self.api_key = api_key
+        if model:
+            self.model = model
+        if OpenAI is None:
+            raise ImportError("Для Grok установите openai: pip install openai")
+        # Grok использует OpenAI-совместимый API
+        self._client = OpenAI(
+            api_key=api_key,
+            base_url="https://api.x.ai/v1",
+            timeout=60.0,
+            max_retries=0,
+            http_client=_shared_http_client()
+        )
     
-    def post_edit(self, original_text: str, translated_text: str, glossary: dict = None) -> str:
+    def _complete(self, system_prompt: str, instructions: str, prompt: str) -> str:
         """Пост-редактировать через Grok."""
         try:
-            from openai import OpenAI
-            # Grok использует OpenAI-совместимый API
-            client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://api.x.ai/v1",
-                timeout=60.0
-            )
-            
-            prompt = self._create_prompt(original_text, translated_text, glossary)
-            system_prompt = self._create_system_prompt()
-            
-            response = client.chat.completions.create(
-                model="grok-3",  # Актуальная модель (grok-beta deprecated)
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Низкая температура для консистентности
-                max_tokens=config.LLM_MAX_TOKENS
-            )
-            
-            return response.choices[0].message.content.strip()
+            text, _ = self._stream_chat(system_prompt, instructions, prompt)
+            return text
         except Exception as e:
-            raise Exception(f"Ошибка пост-редактирования Grok: {e}")
+            raise Exception(f"Ошибка пост-редактирования Grok: {e}") from e
 
 
-def get_llm_editor(editor_name: str = None) -> LLMPostEditor:
+# Название редактора -> (класс, атрибут config с API ключом)
+_EDITORS = {
+    "gpt4": (GPT4PostEditor, "OPENAI_API_KEY"),
+    "claude": (ClaudePostEditor, "ANTHROPIC_API_KEY"),
+    "deepseek": (DeepSeekPostEditor, "DEEPSEEK_API_KEY"),
+    "crok": (CrokPostEditor, "CROK_API_KEY"),
+    "grok": (GrokPostEditor, "GROK_API_KEY"),
+}
+
+
+def get_llm_editor(editor_name: str = None, model: Optional[str] = None) -> LLMPostEditor:
     """
     Получить экземпляр LLM пост-редактора.
     
     Args:
-        editor_name: Название редактора (gpt4, claude, deepseek, crok)
+        editor_name: Название редактора (gpt4, claude, deepseek, crok, grok)
+        model: Модель вместо заданной в config.MODELS
         
     Returns:
         Экземпляр LLMPostEditor
     """
     editor_name = editor_name or config.DEFAULT_LLM_ENGINE
     
-    if editor_name.lower() == "gpt4":
-        return GPT4PostEditor(config.OPENAI_API_KEY)
-    elif editor_name.lower() == "claude":
-        return ClaudePostEditor(config.ANTHROPIC_API_KEY)
-    elif editor_name.lower() == "deepseek":
-        return DeepSeekPostEditor(config.DEEPSEEK_API_KEY)
-    elif editor_name.lower() == "crok":
-        return CrokPostEditor(config.CROK_API_KEY)
-    elif editor_name.lower() == "grok":
-        return GrokPostEditor(config.GROK_API_KEY)
-    else:
-        raise ValueError(f"Неизвестный LLM редактор: {editor_name}")
-
+    try:
+        editor_class, key_attr = _EDITORS[editor_name.lower()]
+    except KeyError:
+        raise ValueError(f"Неизвестный LLM редактор: {editor_name}") from None
+    
+    return editor_class(getattr(config, key_attr), model=model)
@@ -4,7 +4,7 @@
 
 import argparse
 import os
-from translator import Translator
+from concurrent.futures import ThreadPoolExecutor
 from config import INPUT_DIR, OUTPUT_DIR
 
 
@@ -15,12 +15,13 @@ def main():
     
     parser.add_argument(
         "input_file",
-        help="Путь к входному .docx файлу (относительно Input/ или абсолютный)"
+        nargs="+",
+        help="Пути к входным .docx файлам (относительно Input/ или абсолютные)"
     )
     
     parser.add_argument(
         "-o", "--output",
-        help="Путь к выходному файлу (по умолчанию: Output/<имя_файла>_EN.docx)"
+        help="Путь к выходному файлу, только для одного входного (по умолчанию: Output/<имя_файла>_EN.docx)"
     )
     
     parser.add_argument(
@@ -37,6 +38,12 @@ def main():
         help="LLM редактор для пост-редактирования (по умолчанию из config)"
     )
     
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Модель LLM редактора, например gpt-4o-mini (по умолчанию из config.MODELS)"
+    )
+    
     parser.add_argument(
         "--batch-size",
         type=int,
@@ -44,6 +51,20 @@ def main():
         help="Количество параграфов для обработки за раз (по умолчанию: 5)"
     )
     
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Количество батчей, переводимых параллельно (по умолчанию: 4)"
+    )
+    
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Количество файлов, переводимых параллельно (по умолчанию: 1)"
+    )
+    
     parser.add_argument(
         "--no-glossary",
         action="store_true",
@@ -56,31 +77,74 @@ def main():
         help="Использовать Translation Memory для повторного использования переводов"
     )
     
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Не использовать кеш MT и ответов LLM (всегда обращаться к API)"
+    )
+    
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Переиспользовать ответы LLM для почти совпадающих параграфов (нужен sentence-transformers)"
+    )
+    
     args = parser.parse_args()
     
-    # Определяем пути к файлам
-    if os.path.isabs(args.input_file):
-        input_path = args.input_file
-    else:
-        input_path = os.path.join(INPUT_DIR, args.input_file)
+    # Все аргументы проверяем до создания переводчика: он загружает
+    # глоссарии и SDK провайдеров, и ошибка в аргументах не должна этого ждать
+    if args.batch_size < 1:
+        parser.error("--batch-size должен быть не меньше 1")
+    if args.workers < 1:
+        parser.error("--workers должен быть не меньше 1")
+    if args.jobs < 1:
+        parser.error("--jobs должен быть не меньше 1")
+    if args.output and len(args.input_file) > 1:
+        parser.error("-o/--output можно указать только для одного входного файла")
     
-    if not os.path.exists(input_path):
-        print(f"Ошибка: файл не найден: {input_path}")
-        return
+    # Определяем пути к файлам: (входной, выходной)
+    jobs = []
+    for input_file in args.input_file:
+        if os.path.isabs(input_file):
+            input_path = input_file
+        else:
+            input_path = os.path.join(INPUT_DIR, input_file)
+        
+        if not os.path.exists(input_path):
+            print(f"Ошибка: файл не найден: {input_path}")
+            return
+        
+        if args.output:
+            output_path = args.output
+        else:
+            # Генерируем имя выходного файла
+            base_name = os.path.splitext(os.path.basename(input_path))[0]
+            output_path = os.path.join(OUTPUT_DIR, f"{base_name}_EN.docx")
+        
+        # Директорию результата создаём сразу: ошибка доступа должна всплыть
+        # до перевода, а не при сохранении в конце
+        try:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        except OSError as e:
+            print(f"Ошибка: не удаётся создать директорию для {output_path}: {e}")
+            return
+        
+        jobs.append((input_path, output_path))
     
-    if args.output:
-        output_path = args.output
-    else:
-        # Генерируем имя выходного файла
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        output_path = os.path.join(OUTPUT_DIR, f"{base_name}_EN.docx")
+    # Импорт по требованию: translator тянет за собой SDK всех провайдеров,
+    # а для --help и ошибок в аргументах они не нужны
+    from translator import Translator
     
     # Создаем переводчик
     try:
         translator = Translator(
             mt_engine=args.mt_engine, 
             llm_editor=args.llm_editor,
-            use_tm=args.use_tm
+            llm_model=args.model,
+            use_tm=args.use_tm,
+            use_cache=not args.no_cache,
+            use_llm_cache=not args.no_cache,
+            use_semantic_cache=args.semantic_cache and not args.no_cache
         )
     except Exception as e:
         print(f"Ошибка инициализации переводчика: {e}")
@@ -89,19 +153,31 @@ def main():
         print("2. Установлены все зависимости: pip install -r requirements.txt")
         return
     
-    # Выполняем перевод
-    try:
-        translator.translate_docx(
-            input_path=input_path,
-            output_path=output_path,
-            batch_size=args.batch_size,
-            use_glossary=not args.no_glossary
-        )
-        print(f"\n✓ Перевод сохранен в: {output_path}")
-    except Exception as e:
-        print(f"\n✗ Ошибка при переводе: {e}")
-        import traceback
-        traceback.print_exc()
+    def translate(job):
+        input_path, output_path = job
+        try:
+            translator.translate_docx(
+                input_path=input_path,
+                output_path=output_path,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                use_glossary=not args.no_glossary
+            )
+            print(f"\n✓ Перевод сохранен в: {output_path}")
+        except Exception as e:
+            print(f"\n✗ Ошибка при переводе {input_path}: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    # Выполняем перевод: один переводчик (глоссарии, клиенты, кеши) на все файлы.
+    # Файлы параллелим потоками, а не процессами: кеши и TM общие, и процессы
+    # перезаписывали бы файлы друг друга
+    if args.jobs > 1 and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            list(executor.map(translate, jobs))
+    else:
+        for job in jobs:
+            translate(job)
 
 
 if __name__ == "__main__":
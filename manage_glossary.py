@@ -3,7 +3,7 @@
 """
 
 import argparse
-import json
+import json_io
 from glossary import Glossary
 
 
@@ -67,10 +67,8 @@ def main():
     
     elif args.command == 'import':
         try:
-            with open(args.file, 'r', encoding='utf-8') as f:
-                imported = json.load(f)
-            for source, target in imported.items():
-                glossary.add(source, target)
+            imported = json_io.load(args.file)
+            glossary.add_many(imported)
             print(f"✓ Импортировано {len(imported)} записей из {args.file}")
         except Exception as e:
             print(f"✗ Ошибка импорта: {e}")
@@ -78,8 +76,7 @@ def main():
     elif args.command == 'export':
         try:
             items = glossary.get_all()
-            with open(args.file, 'w', encoding='utf-8') as f:
-                json.dump(items, f, ensure_ascii=False, indent=2)
+            json_io.dump(items, args.file)
             print(f"✓ Экспортировано {len(items)} записей в {args.file}")
         except Exception as e:
             print(f"✗ Ошибка экспорта: {e}")
@@ -87,18 +84,15 @@ def main():
     elif args.command == 'import-csv':
         try:
             import csv
-            imported_count = 0
-            with open(args.file, 'r', encoding='utf-8') as f:
+            with open(args.file, 'r', encoding='utf-8', newline='') as f:
                 reader = csv.reader(f)
                 # Пропускаем заголовок, если есть
                 header = next(reader, None)
-                for row in reader:
-                    if len(row) >= 2:
-                        source = row[0].strip()
-                        target = row[1].strip()
-                        if source and target:
-                            glossary.add(source, target)
-                            imported_count += 1
+                # Строки разбираем одним генератором, без вызова add на каждую
+                rows = ((row[0].strip(), row[1].strip()) for row in reader if len(row) >= 2)
+                new_entries = {source: target for source, target in rows if source and target}
+            glossary.add_many(new_entries)
+            imported_count = len(new_entries)
             print(f"✓ Импортировано {imported_count} записей из {args.file}")
         except Exception as e:
             print(f"✗ Ошибка импорта CSV: {e}")
@@ -5,13 +5,69 @@
 - Экономия денег при повторных запусках
 - Ускорение тестирования
 - Консистентность результатов
+
+Хранилище - SQLite: запись перевода - одна вставка строки вместо
+перезаписи всего файла, при запуске файл не разбирается целиком.
 """
 
-import json
+import atexit
 import os
 import hashlib
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+import json_io
 from typing import Dict, Optional
-from datetime import datetime
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Алгоритм ключей - свойство файла кеша (meta.hash_version), а не окружения:
+# установка или удаление необязательного пакета не должна делать записи
+# недоступными. Новые базы используют blake2b из stdlib; sha256 - ключи
+# баз, созданных до появления hash_version; xxh3 - баз, созданных с xxhash
+HASH_VERSION = "blake2b_128"
+_LEGACY_HASH_VERSION = "sha256"
+
+_HASHERS = {
+    "blake2b_128": lambda data: hashlib.blake2b(data, digest_size=16).hexdigest(),
+    "sha256": lambda data: hashlib.sha256(data).hexdigest(),
+}
+if XXHASH_AVAILABLE:
+    _HASHERS["xxh3_128"] = xxhash.xxh3_128_hexdigest
+
+
+class _BloomFilter:
+    """
+    Фильтр Блума по ключам кеша: «точно нет» без запроса к базе.
+
+    Ключ уже хеш (не короче 128 бит), поэтому позиции берутся из двух
+    половин его первых 128 бит (двойное хеширование), без повторного хеширования.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, key: str):
+        h1 = int(key[:16], 16)
+        h2 = int(key[16:32], 16) | 1
+        return ((h1 + i * h2) % self._size for i in range(self._hashes))
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
 
 
 class MTCache:
@@ -19,90 +75,227 @@ class MTCache:
     Кеш для результатов машинного перевода.
     Хранит результаты по хешу исходного текста.
     """
-    
-    def __init__(self, cache_file: str = "mt_cache.json"):
+
+    def __init__(self, cache_file: str = "mt_cache.db", legacy_file: str = "mt_cache.json"):
         """
         Args:
-            cache_file: Путь к файлу кеша
+            cache_file: Путь к файлу базы кеша
+            legacy_file: JSON кеш прежнего формата; переносится в базу, пока она пуста
         """
         self.cache_file = cache_file
-        self.cache: Dict[str, Dict] = {}
+        self.legacy_file = legacy_file
         self.hits = 0  # Счётчик попаданий в кеш
         self.misses = 0  # Счётчик промахов
+        # Записи коммитим пачками: flush() каждые _flush_every вставок,
+        # в конце перевода документа и при выходе из процесса
+        self._dirty_count = 0
+        self._flush_every = 50
+        # Объём закешированного исходного текста (для estimate_savings):
+        # сами тексты не храним, только счётчик в meta
+        self._pending_chars = 0
+        # Горячие ключи держим в памяти процесса: повторный get не идёт в SQLite
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self._hot_size = 8192
+        # Кеш общий для всех Translator в процессе (get_mt_cache),
+        # поэтому соединение разделяем между потоками под блокировкой
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute("PRAGMA cache_size=-16000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._migrate_layout()
+        # Ключ уже кодирует движок, языки и текст - храним только перевод
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mt (key TEXT PRIMARY KEY, translation TEXT) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._check_hash_version()
         self.load()
-    
+        self._rebuild_bloom()
+        atexit.register(self.flush)
+
+    def _migrate_layout(self):
+        """Перевести таблицу прежнего вида (с исходным текстом, языками и датой) на key → translation."""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(mt)")]
+        if not columns or columns == ['key', 'translation']:
+            return
+        cached_chars = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(source_text)), 0) FROM mt"
+        ).fetchone()[0]
+        self._conn.execute("ALTER TABLE mt RENAME TO mt_old")
+        self._conn.execute(
+            "CREATE TABLE mt (key TEXT PRIMARY KEY, translation TEXT) WITHOUT ROWID"
+        )
+        self._conn.execute("INSERT INTO mt SELECT key, translation FROM mt_old")
+        self._conn.execute("DROP TABLE mt_old")
+        self._set_meta('cached_chars', cached_chars)
+        self._conn.commit()
+
+    def _get_meta(self, name: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_meta(self, name: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, str(value)))
+
+    def _cached_chars(self) -> int:
+        return int(self._get_meta('cached_chars') or 0) + self._pending_chars
+
+    def _check_hash_version(self):
+        """
+        Выбрать хеш ключей, которым посчитаны записи этой базы.
+
+        Записи не удаляются никогда: если хеш базы здесь недоступен,
+        новые ключи считаются HASH_VERSION, а старые записи остаются
+        в базе и снова доступны там, где этот хеш есть.
+        """
+        with self._lock:
+            version = self._get_meta('hash_version')
+            if version is None:
+                # База без hash_version: пустая - новая, иначе - ключи sha256
+                version = _LEGACY_HASH_VERSION if self._count() else HASH_VERSION
+                self._set_meta('hash_version', version)
+                self._conn.commit()
+            self._hash_version = version if version in _HASHERS else HASH_VERSION
+            if self._hash_version != version:
+                print(f"⚠️ MT кеш: ключи посчитаны хешем {version}, он недоступен "
+                      f"(для xxh3_128 установите xxhash); записи сохранены, "
+                      f"новые ключи - {HASH_VERSION}")
+            self._hash_hex = _HASHERS[self._hash_version]
+
+    def _rebuild_bloom(self):
+        """Построить фильтр Блума по всем ключам базы (с запасом на рост)."""
+        with self._lock:
+            total = self._count()
+            self._bloom = _BloomFilter(capacity=max(1024, 4 * total))
+            for (key,) in self._conn.execute("SELECT key FROM mt"):
+                self._bloom.add(key)
+
     def load(self):
-        """Загрузить кеш из файла."""
-        if os.path.exists(self.cache_file):
+        """Подключить кеш: при пустой базе перенести записи из JSON кеша прежнего формата."""
+        with self._lock:
+            total = self._count()
+            if total == 0 and self.legacy_file and os.path.exists(self.legacy_file):
+                try:
+                    legacy = json_io.load(self.legacy_file).get('cache', {})
+                    # Старые ключи - SHA256 той же строки, что считает make_key: переносим
+                    # их как есть и считаем новые ключи тем же хешем. Пересчитать ключ
+                    # из source_text нельзя - прежний формат обрезал его до 200 символов
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO mt VALUES (?, ?)",
+                        ((key, entry.get('translation')) for key, entry in legacy.items())
+                    )
+                    self._set_meta('hash_version', _LEGACY_HASH_VERSION)
+                    self._set_meta('cached_chars', sum(len(entry.get('source_text') or '')
+                                                       for entry in legacy.values()))
+                    self._conn.commit()
+                    self._hash_version = _LEGACY_HASH_VERSION
+                    self._hash_hex = _HASHERS[_LEGACY_HASH_VERSION]
+                    total = self._count()
+                    print(f"✓ MT кеш перенесён из {self.legacy_file}: {total} записей")
+                except Exception as e:
+                    print(f"Ошибка переноса MT кеша: {e}")
+            elif total:
+                print(f"✓ MT кеш загружен: {total} записей")
+
+    def flush(self):
+        """Зафиксировать накопленные записи в базе."""
+        with self._lock:
+            if not self._dirty_count:
+                return
             try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.cache = data.get('cache', {})
-                    print(f"✓ MT кеш загружен: {len(self.cache)} записей")
-            except Exception as e:
-                print(f"Ошибка загрузки MT кеша: {e}")
-                self.cache = {}
-        else:
-            self.cache = {}
-    
+                if self._pending_chars:
+                    self._set_meta('cached_chars', self._cached_chars())
+                self._conn.commit()
+                self._dirty_count = 0
+                self._pending_chars = 0
+            except sqlite3.Error as e:
+                print(f"Ошибка сохранения MT кеша: {e}")
+
     def save(self):
-        """Сохранить кеш в файл."""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'cache': self.cache,
-                    'metadata': {
-                        'last_updated': datetime.now().isoformat(),
-                        'total_entries': len(self.cache)
-                    }
-                }, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка сохранения MT кеша: {e}")
-    
-    def _make_key(self, text: str, source_lang: str, target_lang: str, engine: str) -> str:
+        """Зафиксировать изменения в базе (синоним flush)."""
+        self.flush()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM mt").fetchone()[0]
+
+    def make_key(self, text: str, source_lang: str, target_lang: str, engine: str) -> str:
         """
         Создать ключ кеша на основе хеша текста и параметров.
-        
+
+        Ключ можно посчитать один раз и передавать в get_by_key/set_by_key/has_key,
+        чтобы не хешировать длинный текст на каждый вызов.
+
         Args:
             text: Исходный текст
             source_lang: Исходный язык
             target_lang: Целевой язык
             engine: Название MT движка
-            
+
         Returns:
-            SHA256 хеш
+            Хеш в hex (алгоритм - hash_version базы, см. _check_hash_version)
         """
         # Создаём строку для хеширования
         cache_string = f"{engine}:{source_lang}:{target_lang}:{text}"
-        return hashlib.sha256(cache_string.encode('utf-8')).hexdigest()
-    
+        return self._hash_hex(cache_string.encode('utf-8'))
+
+    _make_key = make_key
+
     def get(self, text: str, source_lang: str, target_lang: str, engine: str) -> Optional[str]:
         """
         Получить перевод из кеша.
-        
+
         Args:
             text: Исходный текст
             source_lang: Исходный язык
             target_lang: Целевой язык
             engine: Название MT движка
-            
+
         Returns:
             Переведённый текст или None
         """
-        key = self._make_key(text, source_lang, target_lang, engine)
-        
-        if key in self.cache:
-            self.hits += 1
-            entry = self.cache[key]
-            return entry.get('translation')
-        
-        self.misses += 1
-        return None
-    
+        return self.get_by_key(self.make_key(text, source_lang, target_lang, engine))
+
+    def get_by_key(self, key: str) -> Optional[str]:
+        """Получить перевод по готовому ключу (см. make_key)."""
+        with self._lock:
+            if key not in self._bloom:
+                self.misses += 1
+                return None
+
+            translation = self._hot.get(key)
+            if translation is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                return translation
+
+            row = self._conn.execute(
+                "SELECT translation FROM mt WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None:
+                self._remember(key, row[0])
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def _remember(self, key: str, translation: str):
+        """Положить перевод в LRU горячих ключей."""
+        self._hot[key] = translation
+        self._hot.move_to_end(key)
+        if len(self._hot) > self._hot_size:
+            self._hot.popitem(last=False)
+
     def set(self, text: str, translation: str, source_lang: str, target_lang: str, engine: str):
         """
         Сохранить перевод в кеш.
-        
+
         Args:
             text: Исходный текст
             translation: Переведённый текст
@@ -110,67 +303,110 @@ class MTCache:
             target_lang: Целевой язык
             engine: Название MT движка
         """
-        key = self._make_key(text, source_lang, target_lang, engine)
-        
-        self.cache[key] = {
-            'source_text': text[:200] + '...' if len(text) > 200 else text,  # Сокращаем для читаемости
-            'translation': translation,
-            'source_lang': source_lang,
-            'target_lang': target_lang,
-            'engine': engine,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        self.save()
-    
+        key = self.make_key(text, source_lang, target_lang, engine)
+        self.set_by_key(key, text, translation, source_lang, target_lang, engine)
+
+    def set_by_key(self, key: str, text: str, translation: str,
+                   source_lang: str, target_lang: str, engine: str):
+        """
+        Сохранить перевод по готовому ключу (см. make_key).
+
+        Остальные параметры в базу не пишутся: ключ уже их кодирует,
+        от текста учитывается только длина для estimate_savings.
+        """
+        with self._lock:
+            try:
+                self._conn.execute("INSERT OR REPLACE INTO mt VALUES (?, ?)", (key, translation))
+            except sqlite3.Error as e:
+                print(f"Ошибка сохранения MT кеша: {e}")
+                return
+            self._remember(key, translation)
+            self._bloom.add(key)
+            if self._bloom.count > self._bloom.capacity:
+                self._rebuild_bloom()
+            self._pending_chars += len(text)
+            self._dirty_count += 1
+            if self._dirty_count >= self._flush_every:
+                self.flush()
+
     def has(self, text: str, source_lang: str, target_lang: str, engine: str) -> bool:
         """Проверить, есть ли перевод в кеше."""
-        key = self._make_key(text, source_lang, target_lang, engine)
-        return key in self.cache
-    
+        return self.has_key(self.make_key(text, source_lang, target_lang, engine))
+
+    def has_key(self, key: str) -> bool:
+        """Проверить наличие перевода по готовому ключу (см. make_key)."""
+        with self._lock:
+            if key not in self._bloom:
+                return False
+            if key in self._hot:
+                return True
+            return self._conn.execute(
+                "SELECT 1 FROM mt WHERE key = ? LIMIT 1", (key,)
+            ).fetchone() is not None
+
     def clear(self):
         """Очистить весь кеш."""
-        self.cache = {}
-        self.hits = 0
-        self.misses = 0
-        self.save()
+        with self._lock:
+            self._conn.execute("DELETE FROM mt")
+            self._set_meta('cached_chars', 0)
+            self._conn.commit()
+            self._dirty_count = 0
+            self._pending_chars = 0
+            self._hot.clear()
+            self._bloom = _BloomFilter(capacity=1024)
+            self.hits = 0
+            self.misses = 0
         print("✓ MT кеш очищен")
-    
+
     def get_stats(self) -> Dict:
         """Получить статистику использования кеша."""
+        with self._lock:
+            total_entries = self._count()
+
         total = self.hits + self.misses
         hit_rate = (self.hits / total * 100) if total > 0 else 0
-        
+
         return {
-            'total_entries': len(self.cache),
+            'total_entries': total_entries,
             'hits': self.hits,
             'misses': self.misses,
             'hit_rate': f"{hit_rate:.1f}%"
         }
-    
+
     def estimate_savings(self, cost_per_char: float = 0.00002) -> Dict:
         """
         Оценить экономию от использования кеша.
-        
+
         Args:
             cost_per_char: Стоимость за символ (примерно для DeepL)
-            
+
         Returns:
             Словарь с информацией об экономии
         """
-        total_cached_chars = sum(
-            len(entry.get('source_text', '')) 
-            for entry in self.cache.values()
-        )
-        
+        with self._lock:
+            total_cached_chars = self._cached_chars()
+
         estimated_savings = total_cached_chars * cost_per_char * self.hits
-        
+
         return {
             'cached_characters': total_cached_chars,
             'cache_hits': self.hits,
             'estimated_savings_usd': f"${estimated_savings:.4f}"
         }
 
+    def __enter__(self) -> "MTCache":
+        return self
+
+    def __exit__(self, *exc_info):
+        # Закрывать не нужно: экземпляр обычно глобальный (get_mt_cache)
+        self.flush()
+
+    def close(self):
+        """Закрыть соединение с базой."""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
 
 # Глобальный экземпляр кеша
 _mt_cache: Optional[MTCache] = None
@@ -186,8 +422,8 @@ def get_mt_cache() -> MTCache:
 
 # Тестирование модуля
 if __name__ == "__main__":
-    cache = MTCache("test_mt_cache.json")
-    
+    cache = MTCache("test_mt_cache.db", legacy_file=None)
+
     # Тест сохранения
     cache.set(
         text="Привет, мир!",
@@ -196,14 +432,16 @@ if __name__ == "__main__":
         target_lang="en",
         engine="deepl"
     )
-    
+
     # Тест получения
     result = cache.get("Привет, мир!", "ru", "en", "deepl")
     print(f"Результат из кеша: {result}")
-    
+
     # Тест статистики
     print(f"Статистика: {cache.get_stats()}")
-    
-    # Очистка тестового файла
-    os.remove("test_mt_cache.json")
 
+    # Очистка тестового файла
+    cache.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists("test_mt_cache.db" + suffix):
+            os.remove("test_mt_cache.db" + suffix)
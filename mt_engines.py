@@ -2,51 +2,154 @@
 Модули для различных систем машинного перевода (MT).
 """
 
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
 import config
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - нужен httpx для HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@lru_cache(maxsize=None)
+def _shared_http_client():
+    """
+    Общий HTTP клиент REST движков (создаётся один раз).
+    
+    Соединения остаются открытыми между запросами, поэтому TCP+TLS
+    рукопожатие не повторяется на каждый батч. С h2 параллельные
+    запросы идут в одном соединении. Пул рассчитан на --workers батчей
+    по concurrency запросов translate_many (4 × 8 по умолчанию), иначе
+    потоки ждали бы свободного соединения.
+    """
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        timeout=30.0
+    )
+
 
 class MTEngine:
     """Базовый класс для MT движков."""
     
+    # Сколько текстов движок принимает за один запрос к API
+    max_batch_size = 1
+    
+    def __init__(self):
+        # Общие параметры запроса по паре языков: собираются один раз,
+        # а не на каждый вызов
+        self._params_cache = {}
+    
     def translate(self, text: str, source_lang: str = "ru", target_lang: str = "en") -> str:
         """Перевести текст."""
+        return self.translate_batch([text], source_lang=source_lang, target_lang=target_lang)[0]
+    
+    def translate_batch(self, texts: List[str], source_lang: str = "ru", target_lang: str = "en") -> List[str]:
+        """
+        Перевести несколько текстов, по max_batch_size за запрос.
+        
+        Returns:
+            Переводы в том же порядке, что и texts
+        """
+        results: List[str] = []
+        for i in range(0, len(texts), self.max_batch_size):
+            results.extend(self._translate_chunk(texts[i:i + self.max_batch_size], source_lang, target_lang))
+        return results
+    
+    def translate_many(self, texts: List[str], source_lang: str = "ru", target_lang: str = "en",
+                       concurrency: int = 8) -> List[str]:
+        """
+        Перевести тексты параллельными запросами по max_batch_size.
+        
+        Запросы к API - чистое ожидание сети, поэтому до concurrency
+        запросов идут одновременно в потоках, а не друг за другом.
+        
+        Returns:
+            Переводы в том же порядке, что и texts
+        """
+        chunks = [texts[i:i + self.max_batch_size] for i in range(0, len(texts), self.max_batch_size)]
+        if concurrency <= 1 or len(chunks) <= 1:
+            return self.translate_batch(texts, source_lang=source_lang, target_lang=target_lang)
+        
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as executor:
+            results = executor.map(
+                lambda chunk: self.translate_batch(chunk, source_lang=source_lang, target_lang=target_lang),
+                chunks
+            )
+            return [translation for chunk_result in results for translation in chunk_result]
+    
+    def _params(self, source_lang: str, target_lang: str):
+        """Параметры запроса для пары языков (см. _build_params)."""
+        params = self._params_cache.get((source_lang, target_lang))
+        if params is None:
+            params = self._params_cache[(source_lang, target_lang)] = self._build_params(source_lang, target_lang)
+        return params
+    
+    def _build_params(self, source_lang: str, target_lang: str):
+        """Собрать параметры запроса, общие для всех текстов пары языков."""
+        raise NotImplementedError
+    
+    def _translate_chunk(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        """Перевести не больше max_batch_size текстов одним запросом."""
         raise NotImplementedError
 
 
 class DeepLEngine(MTEngine):
     """DeepL API для перевода."""
     
+    # Ограничение DeepL API на число текстов в запросе
+    max_batch_size = 50
+    
     def __init__(self, api_key: str, glossary_id: str = None):
         if not api_key:
             raise ValueError("DeepL API ключ не указан")
+        super().__init__()
         try:
             import deepl
             self.translator = deepl.Translator(api_key)
             self.glossary_id = glossary_id  # ID глоссария в DeepL (если есть)
         except Exception as e:
             raise ValueError(f"Ошибка инициализации DeepL: {e}")
+        if self.glossary_id:
+            print(f"  Используется глоссарий DeepL: {self.glossary_id}")
     
     def translate(self, text: str, source_lang: str = "ru", target_lang: str = "en-US") -> str:
         """Перевести текст через DeepL."""
+        return super().translate(text, source_lang=source_lang, target_lang=target_lang)
+    
+    def translate_batch(self, texts: List[str], source_lang: str = "ru", target_lang: str = "en-US") -> List[str]:
+        """Перевести несколько текстов через DeepL."""
+        return super().translate_batch(texts, source_lang=source_lang, target_lang=target_lang)
+    
+    def _build_params(self, source_lang: str, target_lang: str) -> dict:
+        # DeepL требует конкретный вариант английского (EN-US или EN-GB)
+        target_lang = target_lang.upper()
+        if target_lang == "EN":
+            target_lang = "EN-US"
+        
+        params = {
+            'source_lang': source_lang.upper(),
+            'target_lang': target_lang
+        }
+        
+        # Если есть glossary_id, используем его
+        if self.glossary_id:
+            params['glossary'] = self.glossary_id
+        return params
+    
+    def _translate_chunk(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
         try:
-            # DeepL требует конкретный вариант английского (EN-US или EN-GB)
-            if target_lang.upper() == "EN":
-                target_lang = "EN-US"
-            
-            # Если есть glossary_id, используем его
-            translate_params = {
-                'text': text,
-                'source_lang': source_lang.upper(),
-                'target_lang': target_lang.upper()
-            }
-            
-            if self.glossary_id:
-                translate_params['glossary'] = self.glossary_id
-                print(f"  Используется глоссарий DeepL: {self.glossary_id}")
-            
-            result = self.translator.translate_text(**translate_params)
-            return result.text
+            # Список текстов DeepL переводит одним запросом
+            results = self.translator.translate_text(texts, **self._params(source_lang, target_lang))
+            return [result.text for result in results]
         except Exception as e:
             raise Exception(f"Ошибка перевода DeepL: {e}")
 
@@ -54,34 +157,44 @@ class DeepLEngine(MTEngine):
 class GoogleTranslateEngine(MTEngine):
     """Google Cloud Translation API."""
     
+    # Ограничение Google Translate v2 на число сегментов q в запросе
+    max_batch_size = 128
+    
     def __init__(self, api_key: str, project_id: str):
         if not api_key:
             raise ValueError("Google API ключ не указан")
+        if httpx is None:
+            raise ImportError("Для Google Translate установите httpx: pip install httpx")
+        super().__init__()
         self.api_key = api_key
         self.project_id = project_id
+        self._http = _shared_http_client()
     
-    def translate(self, text: str, source_lang: str = "ru", target_lang: str = "en") -> str:
-        """Перевести текст через Google Translate API."""
+    def _build_params(self, source_lang: str, target_lang: str) -> list:
+        return [
+            ('key', self.api_key),
+            ('source', source_lang),
+            ('target', target_lang),
+            ('format', 'text')
+        ]
+    
+    def _translate_chunk(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        """Перевести тексты через Google Translate API."""
         try:
-            import requests
-            
-            # Используем REST API Google Translate
+            # Используем REST API Google Translate; тексты идут в теле формы
+            # (повторяющиеся q), иначе URL растёт вместе с батчем и упирается в 414
             url = "https://translation.googleapis.com/language/translate/v2"
-            params = {
-                'key': self.api_key,
-                'q': text,
-                'source': source_lang,
-                'target': target_lang,
-                'format': 'text'
-            }
+            data = {'q': list(texts)}
             
-            response = requests.post(url, params=params)
+            response = self._http.post(url, params=self._params(source_lang, target_lang), data=data)
             response.raise_for_status()
             
             result = response.json()
             if 'data' in result and 'translations' in result['data']:
                 translations = result['data']['translations']
-                return ' '.join([t['translatedText'] for t in translations])
+                if len(translations) != len(texts):
+                    raise Exception("Число переводов не совпадает с числом текстов")
+                return [t['translatedText'] for t in translations]
             else:
                 raise Exception("Неожиданный формат ответа от Google API")
         except Exception as e:
@@ -91,29 +204,39 @@ class GoogleTranslateEngine(MTEngine):
 class YandexTranslateEngine(MTEngine):
     """Yandex Translate API."""
     
+    # Параметр text можно повторять; держим запрос небольшим
+    max_batch_size = 32
+    
     def __init__(self, api_key: str):
         if not api_key:
             raise ValueError("Yandex API ключ не указан")
+        if httpx is None:
+            raise ImportError("Для Yandex Translate установите httpx: pip install httpx")
+        super().__init__()
         self.api_key = api_key
+        self._http = _shared_http_client()
     
-    def translate(self, text: str, source_lang: str = "ru", target_lang: str = "en") -> str:
-        """Перевести текст через Yandex Translate."""
+    def _build_params(self, source_lang: str, target_lang: str) -> list:
+        return [
+            ('key', self.api_key),
+            ('lang', f'{source_lang}-{target_lang}')
+        ]
+    
+    def _translate_chunk(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        """Перевести тексты через Yandex Translate."""
         try:
-            import requests
-            
             url = "https://translate.yandex.net/api/v1.5/tr.json/translate"
-            params = {
-                'key': self.api_key,
-                'text': text,
-                'lang': f'{source_lang}-{target_lang}'
-            }
+            # Тексты передаём в теле формы, а не в строке запроса
+            data = {'text': list(texts)}
             
-            response = requests.post(url, params=params)
+            response = self._http.post(url, params=self._params(source_lang, target_lang), data=data)
             response.raise_for_status()
             
             result = response.json()
             if 'text' in result and result['text']:
-                return ' '.join(result['text'])
+                if len(result['text']) != len(texts):
+                    raise Exception("Число переводов не совпадает с числом текстов")
+                return result['text']
             else:
                 raise Exception("Пустой ответ от Yandex API")
         except Exception as e:
@@ -2,11 +2,20 @@
 Модуль для контроля качества (QA) перевода.
 """
 
-import json
 import os
-from typing import List, Dict, Tuple
+import re
+import json_io
+from bisect import bisect_right
+from typing import Iterator, List, Dict, Optional, Set, Tuple
 from docx_handler import DocxHandler
 
+# Aho–Corasick находит все термины глоссария за один проход по параграфу
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
 
 class QAChecker:
     """Класс для проверки качества перевода."""
@@ -15,58 +24,171 @@ class QAChecker:
         self.glossary_file = glossary_file
         self.glossary = self._load_glossary()
         self.docx_handler = DocxHandler()
+        # Термины в нижнем регистре считаем один раз, а не на каждый параграф
+        self.glossary_lower = [(s.lower(), t.lower(), s, t) for s, t in self.glossary.items()]
+        self._words = self._term_words()
+        self._automaton = self._build_automaton() if AHOCORASICK_AVAILABLE else None
+        # Без pyahocorasick - одно скомпилированное регулярное выражение на все термины
+        self._glossary_re = self._build_regex() if self._automaton is None else None
+        # Позиция термина в глоссарии - чтобы проблемы шли в порядке глоссария
+        self._term_order = {source: i for i, source in enumerate(self.glossary)}
     
     def _load_glossary(self) -> Dict[str, str]:
         """Загрузить глоссарий."""
         if os.path.exists(self.glossary_file):
             try:
-                with open(self.glossary_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return json_io.load(self.glossary_file)
             except Exception as e:
                 print(f"Ошибка загрузки глоссария: {e}")
                 return {}
         return {}
     
-    def check_glossary_compliance(self, translated_text: str) -> List[Dict]:
+    def _term_words(self) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Собрать исходные и целевые термины глоссария в нижнем регистре.
+        
+        Значение каждого слова - пары (вид, исходный термин), так как одно
+        и то же слово может быть целевым для нескольких терминов.
+        """
+        words: Dict[str, List[Tuple[str, str]]] = {}
+        for source_lower, target_lower, source, _ in self.glossary_lower:
+            if source_lower:
+                words.setdefault(source_lower, []).append(('s', source))
+            if target_lower:
+                words.setdefault(target_lower, []).append(('t', source))
+        return words
+    
+    def _build_automaton(self):
+        """Построить автомат Aho–Corasick по всем терминам глоссария."""
+        if not self._words:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for word, refs in self._words.items():
+            automaton.add_word(word, refs)
+        automaton.make_automaton()
+        return automaton
+    
+    def _build_regex(self):
+        """
+        Скомпилировать все термины глоссария в одно регулярное выражение.
+        
+        Альтернатива внутри lookahead проверяется в каждой позиции текста,
+        поэтому находятся и пересекающиеся термины; из начинающихся в одной
+        позиции выражение берёт самый длинный (термины отсортированы по длине),
+        а более короткие - его префиксы - добавляются по _prefixes.
+        """
+        if not self._words:
+            return None
+        
+        ordered = sorted(self._words, key=len, reverse=True)
+        self._prefixes = {
+            word: [other for other in ordered if len(other) < len(word) and word.startswith(other)]
+            for word in ordered
+        }
+        return re.compile('(?=(' + '|'.join(map(re.escape, ordered)) + '))')
+    
+    def _scan(self, text_lower: str) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+        """
+        Найти вхождения терминов глоссария в тексте за один проход.
+        
+        Yields:
+            (индекс последнего символа вхождения, пары (вид, исходный термин))
+        """
+        if self._automaton is not None:
+            yield from self._automaton.iter(text_lower)
+        elif self._glossary_re is not None:
+            for match in self._glossary_re.finditer(text_lower):
+                start = match.start()
+                word = match.group(1)
+                yield start + len(word) - 1, self._words[word]
+                for prefix in self._prefixes[word]:
+                    yield start + len(prefix) - 1, self._words[prefix]
+    
+    def _find_terms(self, translated_lower: str) -> Tuple[Set[str], Set[str]]:
+        """
+        Найти термины глоссария в тексте.
+        
+        Returns:
+            (исходные термины, найденные в тексте;
+             исходные термины, чей перевод найден в тексте)
+        """
+        src_hits: Set[str] = set()
+        tgt_hits: Set[str] = set()
+        for _, refs in self._scan(translated_lower):
+            for kind, source in refs:
+                (src_hits if kind == 's' else tgt_hits).add(source)
+        return src_hits, tgt_hits
+    
+    def check_glossary_compliance(self, translated_text: str,
+                                  translated_lower: Optional[str] = None) -> List[Dict]:
         """
         Проверить соответствие перевода глоссарию.
         
         Args:
             translated_text: Переведенный текст
+            translated_lower: Тот же текст в нижнем регистре, если уже посчитан
             
         Returns:
             Список найденных проблем
         """
+        if translated_lower is None:
+            translated_lower = translated_text.lower()
+        return self._term_issues(*self._find_terms(translated_lower))
+    
+    def _term_issues(self, src_hits: Set[str], tgt_hits: Set[str]) -> List[Dict]:
+        """Собрать проблемы по найденным в тексте терминам (см. _find_terms)."""
         issues = []
-        translated_lower = translated_text.lower()
         
-        for source, target in self.glossary.items():
-            source_lower = source.lower()
-            target_lower = target.lower()
+        # Разбираем только термины, исходное слово которых встретилось в тексте
+        for source in sorted(src_hits, key=self._term_order.__getitem__):
+            target = self.glossary[source]
             
-            # Проверяем, используется ли правильный перевод из глоссария
-            if source_lower in translated_lower:
-                # Если исходное слово найдено в переводе - это проблема
+            # Каждый термин даёт не больше одной проблемы
+            if source not in tgt_hits:
+                # Русское слово осталось, а перевода из глоссария нет
                 issues.append({
-                    'type': 'glossary_violation',
+                    'type': 'missing_translation',
                     'source': source,
                     'expected': target,
                     'severity': 'high',
-                    'message': f"Найдено русское слово '{source}' в переводе. Ожидается '{target}'"
+                    'message': f"Слово '{source}' не переведено как '{target}'"
                 })
-            
-            # Проверяем, используется ли правильный перевод
-            if target_lower not in translated_lower and source_lower in translated_lower:
+            else:
+                # Перевод есть, но рядом осталось и русское слово
                 issues.append({
-                    'type': 'missing_translation',
+                    'type': 'glossary_violation',
                     'source': source,
                     'expected': target,
                     'severity': 'high',
-                    'message': f"Слово '{source}' не переведено как '{target}'"
+                    'message': f"Найдено русское слово '{source}' в переводе. Ожидается '{target}'"
                 })
         
         return issues
     
+    def _find_terms_many(self, paragraphs: List[str]) -> List[Tuple[Set[str], Set[str]]]:
+        """
+        Найти термины глоссария в каждом параграфе (см. _find_terms).
+        
+        Весь документ сканируется за один проход: параграфы склеиваются
+        через \\x00, который не встречается в терминах, а совпадение
+        относится к параграфу по смещению своего конца.
+        """
+        lowered = [para.lower() for para in paragraphs]
+        
+        starts = []
+        offset = 0
+        for para_lower in lowered:
+            starts.append(offset)
+            offset += len(para_lower) + 1
+        
+        hits: List[Tuple[Set[str], Set[str]]] = [(set(), set()) for _ in paragraphs]
+        for end, refs in self._scan('\x00'.join(lowered)):
+            src_hits, tgt_hits = hits[bisect_right(starts, end) - 1]
+            for kind, source in refs:
+                (src_hits if kind == 's' else tgt_hits).add(source)
+        return hits
+    
     def check_consistency(self, translated_paragraphs: List[str]) -> List[Dict]:
         """
         Проверить консистентность перевода между параграфами.
@@ -80,9 +202,8 @@ class QAChecker:
         issues = []
         
         # Проверяем использование терминов из глоссария
-        for i, para in enumerate(translated_paragraphs):
-            para_issues = self.check_glossary_compliance(para)
-            for issue in para_issues:
+        for i, (src_hits, tgt_hits) in enumerate(self._find_terms_many(translated_paragraphs)):
+            for issue in self._term_issues(src_hits, tgt_hits):
                 issue['paragraph'] = i + 1
                 issues.append(issue)
         
@@ -0,0 +1,65 @@
+"""
+Модуль для ограничения частоты запросов к API провайдеров LLM.
+
+Ограничивает одновременно выполняемые запросы и держит запросы и токены
+в пределах лимитов провайдера за скользящую минуту (RPM / TPM).
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов для одного провайдера.
+    Потокобезопасен: один экземпляр разделяется всеми потоками перевода.
+    """
+
+    WINDOW = 60.0  # Скользящее окно, секунд
+
+    def __init__(self, rpm: int, tpm: int, max_concurrent: int):
+        """
+        Args:
+            rpm: Максимум запросов в минуту
+            tpm: Максимум токенов в минуту
+            max_concurrent: Максимум одновременных запросов
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._window = deque()  # (время запроса, токены)
+        self._window_tokens = 0
+
+    @contextmanager
+    def limit(self, tokens: int):
+        """
+        Занять слот под запрос, дождавшись свободного бюджета.
+
+        Args:
+            tokens: Оценка числа токенов запроса
+        """
+        with self._slots:
+            self._reserve(tokens)
+            yield
+
+    def _reserve(self, tokens: int):
+        """Дождаться, пока запрос укладывается в RPM и TPM, и учесть его."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._window and now - self._window[0][0] >= self.WINDOW:
+                    self._window_tokens -= self._window.popleft()[1]
+
+                # Запрос больше всего TPM пропускаем в пустое окно, иначе он ждал бы вечно
+                fits_tokens = self._window_tokens + tokens <= self.tpm or not self._window
+                if len(self._window) < self.rpm and fits_tokens:
+                    self._window.append((now, tokens))
+                    self._window_tokens += tokens
+                    return
+
+                delay = self.WINDOW - (now - self._window[0][0])
+            time.sleep(delay)
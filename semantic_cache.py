@@ -0,0 +1,184 @@
+"""
+Модуль семантического кеша ответов LLM.
+
+Дополняет точный кеш (llm_cache): находит ранее отредактированный параграф,
+почти совпадающий с текущим (косинусная близость эмбеддингов не ниже порога),
+и возвращает его ответ без обращения к API.
+
+Эмбеддинги строит локальная мультиязычная модель sentence-transformers (CPU,
+без API ключа). Без установленного sentence-transformers кеш недоступен.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+
+class _Partition:
+    """Эмбеддинги и ответы одного раздела кеша (редактор, модель, промпт)."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((64, dim), dtype=np.float32)
+        self.responses: List[str] = []
+
+    def add(self, vector: "np.ndarray", response: str):
+        size = len(self.responses)
+        if size == len(self.vectors):
+            # Удваиваем буфер, чтобы вставка не копировала матрицу каждый раз
+            grown = np.empty((size * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:size] = self.vectors
+            self.vectors = grown
+        self.vectors[size] = vector
+        self.responses.append(response)
+
+    def best(self, vector: "np.ndarray"):
+        """Ближайший ответ и его близость (векторы нормированы: скалярное произведение = косинус)."""
+        scores = self.vectors[:len(self.responses)] @ vector
+        index = int(scores.argmax())
+        return self.responses[index], float(scores[index])
+
+
+class SemanticCache:
+    """
+    Семантический кеш ответов LLM.
+    Ответы разделены по редактору, модели и статичной части промпта, поэтому
+    при другом глоссарии или другой модели совпадения не переиспользуются.
+    """
+
+    def __init__(self, cache_file: str = "llm_semantic_cache.db",
+                 model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+                 threshold: float = 0.97):
+        """
+        Args:
+            cache_file: Путь к файлу базы кеша
+            model_name: Модель sentence-transformers для эмбеддингов
+            threshold: Минимальная косинусная близость для попадания
+        """
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            raise ImportError("Для семантического кеша установите sentence-transformers")
+
+        self.cache_file = cache_file
+        self.threshold = threshold
+        self.hits = 0  # Счётчик попаданий в кеш
+        self.misses = 0  # Счётчик промахов
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self._dim = self._model.get_sentence_embedding_dimension()
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_semantic (partition TEXT, embedding BLOB, response TEXT)"
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """Загрузить сохранённые эмбеддинги в память."""
+        for partition, embedding, response in self._conn.execute(
+                "SELECT partition, embedding, response FROM llm_semantic"):
+            self._get_partition(partition).add(np.frombuffer(embedding, dtype=np.float32), response)
+        if self._partitions:
+            total = sum(len(p.responses) for p in self._partitions.values())
+            print(f"✓ Семантический кеш загружен: {total} записей")
+
+    def _get_partition(self, partition: str) -> _Partition:
+        entry = self._partitions.get(partition)
+        if entry is None:
+            entry = self._partitions[partition] = _Partition(self._dim)
+        return entry
+
+    @staticmethod
+    def make_partition(editor: str, model: str, system_prompt: str, instructions: str) -> str:
+        """Ключ раздела кеша: SHA256 от редактора, модели и статичной части промпта."""
+        partition_string = "\x00".join((editor, model, system_prompt, instructions))
+        return hashlib.sha256(partition_string.encode('utf-8')).hexdigest()
+
+    def embed(self, original_text: str, translated_text: str) -> "np.ndarray":
+        """Нормированный эмбеддинг пары (оригинал, машинный перевод)."""
+        return self._model.encode(
+            f"{original_text}\n{translated_text}", normalize_embeddings=True
+        ).astype(np.float32)
+
+    def get(self, partition: str, vector: "np.ndarray") -> Optional[str]:
+        """
+        Найти ответ для почти совпадающего параграфа.
+
+        Args:
+            partition: Ключ раздела (make_partition)
+            vector: Эмбеддинг запроса (embed)
+
+        Returns:
+            Ответ LLM или None
+        """
+        with self._lock:
+            entry = self._partitions.get(partition)
+            if entry is not None:
+                response, score = entry.best(vector)
+                if score >= self.threshold:
+                    self.hits += 1
+                    return response
+
+            self.misses += 1
+            return None
+
+    def set(self, partition: str, vector: "np.ndarray", response: str):
+        """Сохранить ответ LLM с эмбеддингом запроса."""
+        with self._lock:
+            self._get_partition(partition).add(vector, response)
+            try:
+                self._conn.execute(
+                    "INSERT INTO llm_semantic VALUES (?, ?, ?)",
+                    (partition, vector.tobytes(), response)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Ошибка сохранения семантического кеша: {e}")
+
+    def get_stats(self) -> Dict:
+        """Получить статистику использования кеша."""
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total > 0 else 0
+
+        return {
+            'total_entries': sum(len(p.responses) for p in self._partitions.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': f"{hit_rate:.1f}%"
+        }
+
+
+# Глобальный экземпляр кеша
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Получить глобальный экземпляр семантического кеша."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+# Тестирование модуля
+if __name__ == "__main__":
+    cache = SemanticCache("test_semantic_cache.db")
+    partition = SemanticCache.make_partition("GPT4PostEditor", "gpt-4o", "system", "rules")
+
+    vector = cache.embed("Он быстро сказал.", "He said quickly.")
+    cache.set(partition, vector, "He said quickly.")
+
+    result = cache.get(partition, cache.embed("Он быстро сказал", "He said quickly"))
+    print(f"Результат из кеша: {result}")
+
+    print(f"Статистика: {cache.get_stats()}")
+
+    os.remove("test_semantic_cache.db")
@@ -14,6 +14,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from translator import Translator
+from mt_cache import get_mt_cache
 
 
 def main():
@@ -59,12 +60,14 @@ def main():
     print("\nНачинаем перевод...\n")
     
     try:
-        translator.translate_docx(
-            input_path=input_file,
-            output_path=output_file,
-            batch_size=3,            # 3 параграфа за раз
-            use_glossary=True
-        )
+        # Записи MT кеша фиксируются при выходе из блока, даже если перевод упал
+        with get_mt_cache():
+            translator.translate_docx(
+                input_path=input_file,
+                output_path=output_file,
+                batch_size=3,            # 3 параграфа за раз
+                use_glossary=True
+            )
         
         print(f"\n✅ ПЕРЕВОД УСПЕШНО ЗАВЕРШЁН!")
         print(f"Результат сохранён: {output_file}")
@@ -8,20 +8,39 @@
 - Три уровня совпадений: exact, fuzzy, suggest
 """
 
-import json
+import atexit
+import json_io
+import math
 import os
 import re
+import threading
 import unicodedata
 from typing import Dict, List, Optional, Tuple
 
-# Используем RapidFuzz для быстрого и точного fuzzy matching
+# RapidFuzz (C++, битово-параллельный InDel) - для быстрого и точного fuzzy matching
+from rapidfuzz import fuzz, process
+
+# NumPy нужен process.cdist: большие TM сравниваются на всех ядрах
 try:
-    from rapidfuzz import fuzz, process
-    RAPIDFUZZ_AVAILABLE = True
+    import numpy as np
+    NUMPY_AVAILABLE = True
 except ImportError:
-    from difflib import SequenceMatcher
-    RAPIDFUZZ_AVAILABLE = False
-    print("⚠️ RapidFuzz не установлен. Используем стандартный SequenceMatcher (медленнее).")
+    NUMPY_AVAILABLE = False
+
+# С какого числа кандидатов параллельный cdist выгоднее однопоточного extract
+_CDIST_MIN_CHOICES = 5000
+# Размер блока матрицы схожести в best_match_many (float64: ~16 МБ)
+_CDIST_BLOCK_CELLS = 2_000_000
+
+
+# Экранирование XML для export_tmx: один проход по строке вместо трёх replace
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+# Исходные тексты TM - русские: без кириллицы нечёткий поиск не нужен
+_CYRILLIC_RE = re.compile('[\u0400-\u04FF]')
 
 
 def normalize_text(text: str) -> str:
@@ -32,9 +51,15 @@ def normalize_text(text: str) -> str:
     - Нормализует Unicode
     - Удаляет пунктуацию для сравнения
     """
-    text = text.strip().lower()
-    text = unicodedata.normalize('NFKC', text)
-    text = re.sub(r'\s+', ' ', text)  # Нормализуем пробелы
+    if text.isascii():
+        # В ASCII \s - ровно те символы, по которым режет str.split(): split/join
+        # схлопывает пробелы одним C-вызовом без regex и сразу отбрасывает края.
+        # NFKC ASCII-строку не меняет
+        return ' '.join(text.lower().split())
+    text = unicodedata.normalize('NFKC', text.strip().lower())
+    # NFKC может дать краевой пробел (например, из '¨'), поэтому тут - regex:
+    # он, в отличие от split/join, такой пробел сохраняет
+    text = _WHITESPACE_RE.sub(' ', text)  # Нормализуем пробелы
     return text
 
 
@@ -44,7 +69,7 @@ def normalize_for_comparison(text: str) -> str:
     Удаляет пунктуацию и лишние символы.
     """
     text = normalize_text(text)
-    text = re.sub(r'[^\w\s]', '', text)  # Удаляем пунктуацию
+    text = _PUNCTUATION_RE.sub('', text)  # Удаляем пунктуацию
     return text
 
 
@@ -58,34 +83,83 @@ class TranslationMemory:
     EXACT_THRESHOLD = 0.98      # 98%+ = exact match
     FUZZY_THRESHOLD = 0.95      # 95%+ = fuzzy match (автоматически использовать)
     SUGGEST_THRESHOLD = 0.80    # 80-95% = suggest (для ручной проверки)
+    # Короче - нечёткий поиск не выполняется: на паре слов схожесть
+    # набирается случайно (точное совпадение всё равно находится)
+    MIN_FUZZY_LENGTH = 8
     
-    def __init__(self, tm_file: str = "translation_memory.json"):
+    # Несколько экземпляров могут писать один файл из разных потоков
+    _save_lock = threading.Lock()
+    
+    def __init__(self, tm_file: str = "translation_memory.json", autosave: bool = False):
+        """
+        Args:
+            tm_file: Путь к файлу TM
+            autosave: Сохранять файл после каждого add(); иначе - flush()
+                в конце перевода документа и при выходе из процесса
+        """
         self.tm_file = tm_file
+        self.autosave = autosave
+        self._dirty = False
         self.memory: List[Dict[str, str]] = []
+        # Нормализованные исходные тексты в порядке self.memory: считаются
+        # один раз при загрузке/добавлении, а не на каждый запрос; по ним
+        # RapidFuzz сравнивает запрос со всеми записями одним вызовом
+        self._norm_sources: List[str] = []
+        # Исходный текст → индекс записи: проверка дубликатов и точных совпадений за O(1)
+        self._source_index: Dict[str, int] = {}
+        # Длина нормализованного текста → индексы записей: кандидаты отбираются
+        # по длине до вычисления схожести (см. _candidates)
+        self._by_len: Dict[int, List[int]] = {}
+        # add() из параллельных батчей translate_docx не должен менять индексы,
+        # пока другой поток отбирает по ним кандидатов
+        self._lock = threading.Lock()
         self.load()
+        atexit.register(self.flush)
     
     def load(self):
         """Загрузить TM из файла."""
         if os.path.exists(self.tm_file):
             try:
-                with open(self.tm_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.memory = data.get('segments', [])
+                data = json_io.load(self.tm_file)
+                self.memory = data.get('segments', [])
+                self._norm_sources = [normalize_for_comparison(e['source']) for e in self.memory]
+                self._source_index = {}
+                self._by_len = {}
+                for i, e in enumerate(self.memory):
+                    self._source_index.setdefault(e['source'], i)
+                    self._by_len.setdefault(len(self._norm_sources[i]), []).append(i)
                 print(f"✓ TM загружена: {len(self.memory)} сегментов")
             except Exception as e:
                 print(f"Ошибка загрузки TM: {e}")
                 self.memory = []
+                self._norm_sources = []
+                self._source_index = {}
+                self._by_len = {}
         else:
             self.memory = []
+            self._norm_sources = []
+            self._source_index = {}
+            self._by_len = {}
             self.save()
     
     def save(self):
         """Сохранить TM в файл."""
-        try:
-            with open(self.tm_file, 'w', encoding='utf-8') as f:
-                json.dump({'segments': self.memory}, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Ошибка сохранения TM: {e}")
+        with self._save_lock:
+            # Снимок под блокировкой: add() из другого потока во время записи
+            # снова пометит TM изменённой и не потеряется
+            with self._lock:
+                segments = list(self.memory)
+                self._dirty = False
+            try:
+                json_io.dump({'segments': segments}, self.tm_file, indent=False)
+            except Exception as e:
+                self._dirty = True
+                print(f"Ошибка сохранения TM: {e}")
+    
+    def flush(self):
+        """Сохранить TM, если после последнего сохранения были изменения."""
+        if self._dirty:
+            self.save()
     
     def add(self, source: str, target: str, metadata: Dict = None):
         """
@@ -102,8 +176,20 @@ class TranslationMemory:
             'metadata': metadata or {}
         }
         # Проверяем на дубликаты
-        if not any(e['source'] == entry['source'] for e in self.memory):
+        if entry['source'] in self._source_index:
+            return
+        norm_source = normalize_for_comparison(entry['source'])
+        with self._lock:
+            if entry['source'] in self._source_index:
+                return
+            index = len(self.memory)
+            self._source_index[entry['source']] = index
             self.memory.append(entry)
+            self._norm_sources.append(norm_source)
+            self._by_len.setdefault(len(norm_source), []).append(index)
+            self._dirty = True
+        # Файл переписывается целиком, поэтому по умолчанию откладываем до flush()
+        if self.autosave:
             self.save()
     
     def search(self, source: str, similarity_threshold: float = None) -> Optional[Tuple[str, float, str]]:
@@ -118,49 +204,144 @@ class TranslationMemory:
             Кортеж (перевод, коэффициент схожести, тип_совпадения) или None
             тип_совпадения: 'exact', 'fuzzy', 'suggest'
         """
-        if similarity_threshold is None:
-            similarity_threshold = self.FUZZY_THRESHOLD
-            
-        if not self.memory:
+        index, similarity, match_type = self.best_match(source)
+        if index is None:
             return None
+        return (self.memory[index]['target'], similarity, match_type)
+    
+    def best_match(self, source: str) -> Tuple[Optional[int], float, str]:
+        """
+        Лучшая запись TM для source за один проход по памяти.
+        
+        Returns:
+            (индекс записи или None, схожесть, тип: 'exact'|'fuzzy'|'suggest'|'none')
+        """
+        if not self.memory:
+            return (None, 0.0, 'none')
             
-        source_norm = normalize_text(source)
-        source_cmp = normalize_for_comparison(source)
+        # Тот же исходный текст уже в TM - нечёткий поиск не нужен
+        exact = self._exact_match(source)
+        if exact is not None:
+            return exact
         
-        best_match = None
-        best_similarity = 0.0
-        match_type = 'none'
+        source_cmp = self._fuzzy_query(source)
+        if source_cmp is None:
+            return (None, 0.0, 'none')
         
-        for entry in self.memory:
-            entry_norm = normalize_text(entry['source'])
-            entry_cmp = normalize_for_comparison(entry['source'])
-            
-            # Вычисляем схожесть
-            if RAPIDFUZZ_AVAILABLE:
-                # RapidFuzz возвращает значение 0-100
-                similarity = fuzz.ratio(source_cmp, entry_cmp) / 100.0
-            else:
-                from difflib import SequenceMatcher
-                similarity = SequenceMatcher(None, source_cmp, entry_cmp).ratio()
-            
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = entry['target']
-                
-                # Определяем тип совпадения
-                if similarity >= self.EXACT_THRESHOLD:
-                    match_type = 'exact'
-                elif similarity >= self.FUZZY_THRESHOLD:
-                    match_type = 'fuzzy'
-                elif similarity >= self.SUGGEST_THRESHOLD:
-                    match_type = 'suggest'
-                else:
-                    match_type = 'none'
+        # Один вызов в C++ по всем записям вместо цикла по fuzz.ratio;
+        # при равной схожести побеждает более ранняя запись.
+        # RapidFuzz возвращает значение 0-100 - с ним и сравниваем пороги
+        found = process.extractOne(
+            source_cmp, self._candidates(source_cmp, self.SUGGEST_THRESHOLD), scorer=fuzz.ratio,
+            score_cutoff=self.SUGGEST_THRESHOLD * 100
+        )
+        if found is None:
+            return (None, 0.0, 'none')
+        _, score, index = found
+        return self._scored_match(index, score)
+    
+    def best_match_many(self, sources: List[str]) -> List[Tuple[Optional[int], float, str]]:
+        """
+        best_match для всех запросов сразу (например, всех параграфов документа).
+        
+        Большая TM сравнивается с запросами блоками через process.cdist: одна
+        матрица схожести на блок, посчитанная на всех ядрах без GIL.
+        Результаты те же, что у best_match по каждому запросу.
+        """
+        if not (NUMPY_AVAILABLE and len(self._norm_sources) >= _CDIST_MIN_CHOICES):
+            return [self.best_match(source) for source in sources]
+        
+        results: List[Tuple[Optional[int], float, str]] = [(None, 0.0, 'none')] * len(sources)
+        queries: Dict[int, str] = {}
+        for position, source in enumerate(sources):
+            exact = self._exact_match(source)
+            if exact is not None:
+                results[position] = exact
+                continue
+            source_cmp = self._fuzzy_query(source)
+            if source_cmp is not None:
+                queries[position] = source_cmp
+        if not queries:
+            return results
         
-        if best_match and best_similarity >= self.SUGGEST_THRESHOLD:
-            return (best_match, best_similarity, match_type)
+        with self._lock:
+            choices = list(self._norm_sources)
+        score_cutoff = self.SUGGEST_THRESHOLD * 100
+        positions = list(queries)
+        # Матрица блока - не больше _CDIST_BLOCK_CELLS оценок
+        block = max(1, _CDIST_BLOCK_CELLS // len(choices))
+        for start in range(0, len(positions), block):
+            chunk = positions[start:start + block]
+            scores = process.cdist(
+                [queries[position] for position in chunk], choices, scorer=fuzz.ratio,
+                score_cutoff=score_cutoff, workers=-1, dtype=np.float64
+            )
+            # argmax берёт первый максимум - как extractOne при равной схожести
+            for position, row, index in zip(chunk, scores, scores.argmax(axis=1)):
+                if row[index] >= score_cutoff:
+                    results[position] = self._scored_match(int(index), float(row[index]))
+        return results
+    
+    def _exact_match(self, source: str) -> Optional[Tuple[int, float, str]]:
+        """Запись с тем же исходным текстом и непустым переводом."""
+        index = self._source_index.get(source.strip())
+        if index is not None and self.memory[index]['target']:
+            return (index, 1.0, 'exact')
         return None
     
+    def _fuzzy_query(self, source: str) -> Optional[str]:
+        """Текст для нечёткого поиска или None, если искать не нужно."""
+        source_cmp = normalize_for_comparison(source)
+        if len(source_cmp) < self.MIN_FUZZY_LENGTH or not _CYRILLIC_RE.search(source_cmp):
+            return None
+        return source_cmp
+    
+    def _scored_match(self, index: int, score: float) -> Tuple[Optional[int], float, str]:
+        """Результат best_match для лучшей записи с оценкой RapidFuzz (0-100)."""
+        if not self.memory[index]['target']:
+            return (None, 0.0, 'none')
+        return (index, score / 100.0, self._match_type(score))
+    
+    def _candidates(self, source_cmp: str, threshold: float):
+        """
+        Записи, которые по длине могут набрать threshold.
+        
+        fuzz.ratio = 1 - indel / (|a| + |b|), а indel не меньше разницы длин,
+        поэтому схожесть не выше 2·min(|a|, |b|) / (|a| + |b|). Из неравенства
+        получается полоса длин [|a|·t/(2-t), |a|·(2-t)/t]; остальные записи
+        отбрасываются без вычисления схожести.
+        
+        Returns:
+            {индекс записи: нормализованный текст} в порядке записей
+            (при равной схожести побеждает более ранняя)
+        """
+        with self._lock:
+            return self._candidates_locked(source_cmp, threshold)
+    
+    def _candidates_locked(self, source_cmp: str, threshold: float):
+        """_candidates под self._lock."""
+        if threshold <= 0:
+            return dict(enumerate(self._norm_sources))
+        length = len(source_cmp)
+        low = math.floor(length * threshold / (2 - threshold))
+        high = math.ceil(length * (2 - threshold) / threshold)
+        # Полоса бывает шире, чем число различных длин в TM - тогда обходим длины
+        if high - low < len(self._by_len):
+            lengths = range(low, high + 1)
+        else:
+            lengths = [band_length for band_length in self._by_len if low <= band_length <= high]
+        indices = [i for band_length in lengths for i in self._by_len.get(band_length, ())]
+        indices.sort()
+        return {i: self._norm_sources[i] for i in indices}
+    
+    def _match_type(self, score: float) -> str:
+        """Тип совпадения по оценке RapidFuzz (0-100) не ниже SUGGEST_THRESHOLD."""
+        if score >= self.EXACT_THRESHOLD * 100:
+            return 'exact'
+        if score >= self.FUZZY_THRESHOLD * 100:
+            return 'fuzzy'
+        return 'suggest'
+    
     def find_in_tm(self, source: str) -> Tuple[Optional[str], float, str]:
         """
         Найти перевод в TM с возвратом типа совпадения.
@@ -190,24 +371,31 @@ class TranslationMemory:
         source_cmp = normalize_for_comparison(source)
         matches = []
         
-        for entry in self.memory:
-            entry_cmp = normalize_for_comparison(entry['source'])
-            
-            if RAPIDFUZZ_AVAILABLE:
-                similarity = fuzz.ratio(source_cmp, entry_cmp) / 100.0
-            else:
-                from difflib import SequenceMatcher
-                similarity = SequenceMatcher(None, source_cmp, entry_cmp).ratio()
-            
-            if similarity >= min_similarity:
-                if similarity >= self.EXACT_THRESHOLD:
-                    match_type = 'exact'
-                elif similarity >= self.FUZZY_THRESHOLD:
-                    match_type = 'fuzzy'
-                else:
-                    match_type = 'suggest'
-                    
-                matches.append((entry['source'], entry['target'], similarity, match_type))
+        candidates = self._candidates(source_cmp, min_similarity)
+        score_cutoff = min_similarity * 100
+        
+        if NUMPY_AVAILABLE and len(candidates) >= _CDIST_MIN_CHOICES:
+            # cdist отпускает GIL и делит кандидатов между всеми ядрами
+            indices = list(candidates)
+            scores = process.cdist(
+                [source_cmp], list(candidates.values()), scorer=fuzz.ratio,
+                score_cutoff=score_cutoff, workers=-1, dtype=np.float64
+            )[0]
+            selected = np.nonzero(scores >= score_cutoff)[0]
+            scored = ((indices[i], scores[i]) for i in selected)
+        else:
+            # Отбор по порогу - тоже в C++
+            scored = (
+                (index, score)
+                for _, score, index in process.extract(
+                    source_cmp, candidates, scorer=fuzz.ratio,
+                    limit=None, score_cutoff=score_cutoff
+                )
+            )
+        
+        for index, score in scored:
+            entry = self.memory[index]
+            matches.append((entry['source'], entry['target'], float(score) / 100.0, self._match_type(score)))
         
         # Сортируем по схожести (от большей к меньшей)
         matches.sort(key=lambda x: x[2], reverse=True)
@@ -220,6 +408,9 @@ class TranslationMemory:
     def clear(self):
         """Очистить TM."""
         self.memory = []
+        self._norm_sources = []
+        self._source_index = {}
+        self._by_len = {}
         self.save()
     
     def export_tmx(self, output_file: str):
@@ -229,20 +420,22 @@ class TranslationMemory:
         Args:
             output_file: Путь к выходному файлу
         """
-        tmx_content = '''<?xml version="1.0" encoding="UTF-8"?>
+        # Пишем потоком: весь документ в памяти не собирается
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write('''<?xml version="1.0" encoding="UTF-8"?>
 <tmx version="1.4">
     <header creationtool="Translation Memory" creationtoolversion="1.0"
             datatype="plaintext" segtype="sentence" adminlang="en"
             srclang="ru" o-tmf="unknown">
     </header>
     <body>
-'''
-        
-        for entry in self.memory:
-            source = entry['source'].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            target = entry['target'].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+''')
             
-            tmx_content += f'''        <tu>
+            for entry in self.memory:
+                source = entry['source'].translate(_XML_ESCAPE)
+                target = entry['target'].translate(_XML_ESCAPE)
+                
+                f.write(f'''        <tu>
             <tuv xml:lang="ru">
                 <seg>{source}</seg>
             </tuv>
@@ -250,13 +443,10 @@ class TranslationMemory:
                 <seg>{target}</seg>
             </tuv>
         </tu>
-'''
-        
-        tmx_content += '''    </body>
-</tmx>'''
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(tmx_content)
+''')
+            
+            f.write('''    </body>
+</tmx>''')
 
 
 class TMEnhancedTranslator:
@@ -286,18 +476,14 @@ class TMEnhancedTranslator:
             Переведенный текст
         """
         if self.tm:
-            # Проверяем TM на точное совпадение
-            tm_match = self.tm.search(text, similarity_threshold=0.98)
-            if tm_match:
-                translation, similarity = tm_match
+            # Один проход по TM: тип лучшего совпадения решает, переводить ли заново
+            index, similarity, match_type = self.tm.best_match(text)
+            if match_type == 'exact':
                 print(f"✓ Найдено в TM (схожесть: {similarity:.2%})")
-                return translation
-            
-            # Проверяем на fuzzy match (может быть полезно для похожих фраз)
-            fuzzy_matches = self.tm.fuzzy_search(text, min_similarity=0.90)
-            if fuzzy_matches:
-                # Используем лучший match как основу, но все равно переводим для контекста
-                print(f"ℹ Найдено {len(fuzzy_matches)} похожих переводов в TM")
+                return self.tm.memory[index]['target']
+            if index is not None:
+                # Похожий перевод есть, но всё равно переводим для контекста
+                print(f"ℹ Похожий перевод в TM (схожесть: {similarity:.2%})")
         
         # Выполняем обычный перевод
         translation = self.translator.translate_text(text, use_glossary=use_glossary)
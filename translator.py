@@ -10,16 +10,20 @@
 - Улучшенные промпты для детской литературы
 """
 
-from typing import List, Optional, Dict
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Tuple
 from mt_engines import get_mt_engine, MTEngine
-from llm_post_editor import get_llm_editor, LLMPostEditor
+from llm_post_editor import get_llm_editor, LLMPostEditor, mark_paragraphs, unmark_paragraphs
 from glossary import Glossary
 from docx_handler import DocxHandler
 from translation_memory import TranslationMemory
 from entity_placeholder import EntityPlaceholder
 from mt_cache import get_mt_cache, MTCache
+from llm_cache import get_llm_cache
 import os
-import json
+import json_io
 
 
 class Translator:
@@ -28,7 +32,10 @@ class Translator:
     def __init__(self, mt_engine: str = None, llm_editor: str = None, 
                  use_tm: bool = False, use_cache: bool = True,
                  use_placeholders: bool = True,
-                 glossary_file: str = "pintek_glossary.json"):
+                 glossary_file: str = "pintek_glossary.json",
+                 use_llm_cache: bool = True, use_semantic_cache: bool = False,
+                 llm_model: Optional[str] = None,
+                 tm: Optional[TranslationMemory] = None):
         """
         Инициализировать переводчик.
         
@@ -39,12 +46,17 @@ class Translator:
             use_cache: Использовать ли кеширование MT
             use_placeholders: Использовать ли placeholders для имён
             glossary_file: Путь к файлу глоссария
+            use_llm_cache: Использовать ли кеширование ответов LLM
+            use_semantic_cache: Переиспользовать ответы LLM для почти совпадающих параграфов
+            llm_model: Модель LLM вместо заданной в config.MODELS
+            tm: Общий экземпляр Translation Memory (при use_tm=True); нужен,
+                когда несколько переводчиков пишут в один файл TM
         """
         self.mt_engine: MTEngine = get_mt_engine(mt_engine)
-        self.llm_editor: LLMPostEditor = get_llm_editor(llm_editor)
+        self.llm_editor: LLMPostEditor = get_llm_editor(llm_editor, model=llm_model)
         self.glossary = Glossary()
         self.docx_handler = DocxHandler()
-        self.tm = TranslationMemory() if use_tm else None
+        self.tm = (tm or TranslationMemory()) if use_tm else None
         self.use_tm = use_tm
         
         # Новые компоненты
@@ -52,38 +64,74 @@ class Translator:
         self.use_cache = use_cache
         self.entity_placeholder = EntityPlaceholder(glossary_file) if use_placeholders else None
         self.use_placeholders = use_placeholders
+        self.llm_cache = get_llm_cache() if use_llm_cache else None
+        self.llm_editor.cache = self.llm_cache
+        self.semantic_cache = None
+        if use_semantic_cache:
+            # Импорт по требованию: sentence-transformers тянет torch и долго загружается
+            from semantic_cache import get_semantic_cache
+            self.semantic_cache = get_semantic_cache()
+        self.llm_editor.semantic_cache = self.semantic_cache
+        
+        # Готовые переводы за время жизни процесса: (текст, use_glossary) → перевод.
+        # Повторный текст не проходит заново ни MT, ни LLM, а одинаковые тексты
+        # из параллельных потоков переводятся один раз (см. translate_text)
+        self._memo: "OrderedDict[Tuple[str, bool], str]" = OrderedDict()
+        self._memo_size = 10000
+        self._memo_lock = threading.Lock()
+        self._in_flight: Dict[Tuple[str, bool], threading.Lock] = {}
         
         # Загружаем расширенный глоссарий из JSON файла
         self._load_extended_glossary(glossary_file)
+        self._warm_up()
         
         print(f"✓ Translator инициализирован:")
         print(f"  - MT Engine: {type(self.mt_engine).__name__}")
-        print(f"  - LLM Editor: {type(self.llm_editor).__name__}")
+        print(f"  - LLM Editor: {type(self.llm_editor).__name__} ({self.llm_editor.model})")
         print(f"  - Translation Memory: {'Да' if use_tm else 'Нет'}")
         print(f"  - MT Cache: {'Да' if use_cache else 'Нет'}")
+        print(f"  - LLM Cache: {'Да' if use_llm_cache else 'Нет'}")
+        print(f"  - Semantic Cache: {'Да' if use_semantic_cache else 'Нет'}")
         print(f"  - Entity Placeholders: {'Да' if use_placeholders else 'Нет'}")
     
     def _load_extended_glossary(self, glossary_file: str):
         """Загрузить расширенный глоссарий из JSON файла."""
         if os.path.exists(glossary_file):
             try:
-                with open(glossary_file, 'r', encoding='utf-8') as f:
-                    glossary_data = json.load(f)
+                # Тот же файл читает EntityPlaceholder: разбираем его один раз
+                glossary_data = json_io.load_cached(glossary_file)
                 
-                for entry in glossary_data:
-                    source = entry.get('source', '')
-                    target = entry.get('target', '')
-                    if source and target:
-                        self.glossary.add(source, target)
+                with self.glossary:
+                    for entry in glossary_data:
+                        source = entry.get('source', '')
+                        target = entry.get('target', '')
+                        if source and target:
+                            self.glossary.add(source, target, flush=False)
                 
                 print(f"✓ Загружен глоссарий: {len(glossary_data)} терминов")
             except Exception as e:
                 print(f"⚠️ Ошибка загрузки глоссария: {e}")
     
+    def _warm_up(self):
+        """
+        Построить заранее то, что иначе создаётся лениво в первом батче.
+        
+        Первые батчи идут параллельно, и без этого каждый поток строил бы
+        замену по глоссарию и загружал бы токенизатор сам.
+        """
+        # Функция замены по глоссарию (автомат или паттерн)
+        self.glossary.apply("")
+        # Токенизатор для оценки размера промпта (tiktoken читает словарь BPE)
+        self.llm_editor._count_tokens("")
+    
     def translate_text(self, text: str, use_glossary: bool = True) -> str:
         """
         Перевести текст с использованием MT + LLM пост-редактирования.
         
+        Текст, уже переведённый в этом процессе, берётся из памяти. Если тот же
+        текст сейчас переводит другой поток, вызов ждёт его результат.
+        С use_cache=False память не используется.
+        
         Args:
             text: Исходный текст на русском
             use_glossary: Использовать ли глоссарий
@@ -91,74 +139,146 @@ class Translator:
         Returns:
             Переведенный текст
         """
+        if not self.use_cache:
+            return self._translate_text(text, use_glossary)
+        
+        key = (text, use_glossary)
+        with self._memo_lock:
+            translation = self._recall(key)
+            if translation is not None:
+                return translation
+            flight = self._in_flight.setdefault(key, threading.Lock())
+        
+        with flight:
+            # Пока ждали блокировку, текст мог перевести другой поток
+            with self._memo_lock:
+                translation = self._recall(key)
+            if translation is not None:
+                return translation
+            try:
+                translation = self._translate_text(text, use_glossary)
+                with self._memo_lock:
+                    self._memo[key] = translation
+                    if len(self._memo) > self._memo_size:
+                        self._memo.popitem(last=False)
+            finally:
+                with self._memo_lock:
+                    self._in_flight.pop(key, None)
+        return translation
+    
+    def _recall(self, key: Tuple[str, bool]) -> Optional[str]:
+        """Перевод из памяти процесса (вызывать под _memo_lock)."""
+        translation = self._memo.get(key)
+        if translation is not None:
+            self._memo.move_to_end(key)
+            print("✓ Текст уже переведён в этом запуске")
+        return translation
+    
+    def _translate_text(self, text: str, use_glossary: bool) -> str:
+        """Перевести текст: TM, MT (с кешем) и LLM пост-редактирование."""
         # Шаг 0: Проверяем Translation Memory
         if self.tm:
-            tm_result = self.tm.find_in_tm(text)
-            translation, similarity, match_type = tm_result
+            index, similarity, match_type = self.tm.best_match(text)
             
             if match_type in ['exact', 'fuzzy']:
                 print(f"✓ Найдено в TM ({match_type}, схожесть: {similarity:.1%})")
-                return translation
+                return self.tm.memory[index]['target']
             elif match_type == 'suggest':
                 print(f"ℹ TM предложение (схожесть: {similarity:.1%}) - используем для контекста")
         
-        # Шаг 1: Entity Placeholders (до MT)
-        entity_mapping = {}
-        text_for_mt = text
+        # Шаг 1: Entity Placeholders (до MT). Каждый параграф размечаем отдельно,
+        # нумерация плейсхолдеров в нём начинается с 0: иначе она зависит от места
+        # параграфа в батче, и от этого меняется его ключ MT кеша
+        source_paragraphs = text.split('\n\n')
+        mt_paragraphs = source_paragraphs
+        entity_mappings: List[Dict[str, str]] = [{} for _ in source_paragraphs]
+        entity_count = 0
         
         if self.use_placeholders and self.entity_placeholder:
-            text_for_mt, entity_mapping = self.entity_placeholder.mark_entities(text)
-            if entity_mapping:
-                print(f"  → Заменено {len(entity_mapping)} сущностей на placeholders")
+            mt_paragraphs = []
+            for i, paragraph in enumerate(source_paragraphs):
+                marked_paragraph, entity_mappings[i] = self.entity_placeholder.mark_entities(paragraph)
+                mt_paragraphs.append(marked_paragraph)
+            entity_count = sum(len(mapping) for mapping in entity_mappings)
+            if entity_count:
+                print(f"  → Заменено {entity_count} сущностей на placeholders")
         
         # Шаг 2: Машинный перевод (с кешированием)
-        mt_translation = None
+        # Параграфы уходят в MT одним запросом списком и кешируются по отдельности:
+        # перевод остаётся в кеше, даже если параграф попадёт в другой батч.
+        # Повторы внутри текста (подписи, разделители) ищем и переводим один раз
+        positions: Dict[str, List[int]] = {}
+        for i, paragraph in enumerate(mt_paragraphs):
+            positions.setdefault(paragraph, []).append(i)
+        
         engine_name = type(self.mt_engine).__name__
+        found: Dict[str, str] = {}
+        cache_keys: Dict[str, str] = {}
         
         if self.use_cache and self.cache:
-            mt_translation = self.cache.get(text_for_mt, "ru", "en-US", engine_name)
-            if mt_translation:
-                print(f"✓ MT из кеша")
+            # Ключ считаем один раз: он же нужен для записи после промаха
+            for paragraph in positions:
+                cache_keys[paragraph] = self.cache.make_key(paragraph, "ru", "en-US", engine_name)
+                cached = self.cache.get_by_key(cache_keys[paragraph])
+                if cached is not None:
+                    found[paragraph] = cached
         
-        if mt_translation is None:
-            print("→ Выполняется машинный перевод...")
-            mt_translation = self.mt_engine.translate(text_for_mt, source_lang="ru", target_lang="en-US")
-            
-            # Сохраняем в кеш
-            if self.use_cache and self.cache:
-                self.cache.set(text_for_mt, mt_translation, "ru", "en-US", engine_name)
+        misses = [paragraph for paragraph in positions if paragraph not in found]
+        if found:
+            print(f"✓ MT из кеша: {len(found)}/{len(positions)}")
         
-        # Шаг 3: Восстановление сущностей после MT
-        if entity_mapping and self.entity_placeholder:
-            mt_translation = self.entity_placeholder.restore_entities(mt_translation, entity_mapping)
-            print(f"  → Восстановлено {len(entity_mapping)} сущностей")
+        if misses:
+            print("→ Выполняется машинный перевод...")
+            translated = self.mt_engine.translate_many(misses, source_lang="ru", target_lang="en-US")
+            for paragraph, paragraph_translation in zip(misses, translated):
+                found[paragraph] = paragraph_translation
+                # Сохраняем в кеш
+                if paragraph in cache_keys:
+                    self.cache.set_by_key(cache_keys[paragraph], paragraph, paragraph_translation,
+                                          "ru", "en-US", engine_name)
         
-        # Шаг 4: Применяем глоссарий к MT переводу (для проверки)
-        if use_glossary:
-            mt_translation = self.glossary.apply(mt_translation)
+        # Шаг 3: Восстановление сущностей после MT - у каждого параграфа своя разметка
+        mt_results = [found[paragraph] for paragraph in mt_paragraphs]
+        if entity_count:
+            mt_results = [
+                self.entity_placeholder.restore_entities(paragraph_translation, mapping) if mapping
+                else paragraph_translation
+                for paragraph_translation, mapping in zip(mt_results, entity_mappings)
+            ]
+            print(f"  → Восстановлено {entity_count} сущностей")
+        mt_translation = '\n\n'.join(mt_results)
         
-        # Шаг 5: LLM пост-редактирование
+        # Шаг 4: LLM пост-редактирование. Глоссарий к MT не применяем:
+        # LLM получает его в промпте, а замены проводит шаг 5
         print("→ Выполняется пост-редактирование через LLM...")
         glossary_dict = self.glossary.get_all() if use_glossary else None
         
+        # Параграфы батча помечаем маркерами: по ним ответ LLM делится на те же
+        # параграфы, даже если модель изменила пустые строки между ними
+        paragraph_count = len(mt_paragraphs)
+        marked = (paragraph_count > 1 and len(text.split('\n\n')) == paragraph_count
+                  and len(mt_translation.split('\n\n')) == paragraph_count)
         final_translation = self.llm_editor.post_edit(
-            original_text=text,
-            translated_text=mt_translation,
+            original_text=mark_paragraphs(text) if marked else text,
+            translated_text=mark_paragraphs(mt_translation) if marked else mt_translation,
             glossary=glossary_dict
         )
+        if marked:
+            final_translation = unmark_paragraphs(final_translation, paragraph_count)
         
-        # Шаг 6: Финальная проверка глоссария
+        # Шаг 5: Финальная проверка глоссария
         if use_glossary:
             final_translation = self.glossary.apply(final_translation)
         
-        # Шаг 7: Сохраняем в Translation Memory
+        # Шаг 6: Сохраняем в Translation Memory
         if self.tm:
             self.tm.add(text, final_translation)
         
         return final_translation
     
     def translate_docx(self, input_path: str, output_path: str, 
-                      batch_size: int = 3, use_glossary: bool = True):
+                      batch_size: int = 3, use_glossary: bool = True,
+                      workers: int = 1):
         """
         Перевести .docx файл.
         
@@ -167,6 +287,7 @@ class Translator:
             output_path: Путь для сохранения переведенного файла
             batch_size: Количество параграфов для обработки за раз
             use_glossary: Использовать ли глоссарий
+            workers: Количество батчей, переводимых параллельно
         """
         print(f"\n{'='*60}")
         print(f"ПЕРЕВОД ДОКУМЕНТА")
@@ -182,37 +303,63 @@ class Translator:
         paragraphs = [p for p in paragraphs if p.strip()]
         print(f"✓ Непустых параграфов: {len(paragraphs)}")
         
-        translated_paragraphs = []
-        total_batches = (len(paragraphs) + batch_size - 1) // batch_size
+        # Одинаковые параграфы (заголовки, разделители, повторяющиеся реплики)
+        # переводим один раз и подставляем перевод во все позиции
+        unique = list(dict.fromkeys(paragraphs))
+        if len(unique) < len(paragraphs):
+            print(f"✓ Уникальных параграфов: {len(unique)}")
         
-        for batch_num, i in enumerate(range(0, len(paragraphs), batch_size), 1):
-            batch = paragraphs[i:i + batch_size]
-            batch_text = '\n\n'.join(batch)
-            
-            print(f"\n--- Батч {batch_num}/{total_batches} ---")
-            print(f"Параграфы {i+1}-{min(i+batch_size, len(paragraphs))}")
-            
-            try:
-                translated_batch = self.translate_text(batch_text, use_glossary=use_glossary)
-                
-                # Разделяем обратно на параграфы
-                translated_batch_paragraphs = translated_batch.split('\n\n')
-                
-                # Если количество совпадает, используем по отдельности
-                if len(translated_batch_paragraphs) == len(batch):
-                    translated_paragraphs.extend(translated_batch_paragraphs)
-                else:
-                    # Иначе добавляем весь текст
-                    translated_paragraphs.append(translated_batch)
-                
-                print(f"✓ Батч {batch_num} переведён успешно")
-                
-            except Exception as e:
-                print(f"✗ Ошибка при переводе батча {batch_num}: {e}")
-                error_marker = f"[ERROR: Translation failed for batch {batch_num}]"
-                translated_paragraphs.append(error_marker)
-                import traceback
-                traceback.print_exc()
+        # Параграфы, найденные в TM, не отправляем ни в MT, ни в LLM
+        translations: Dict[str, str] = {}
+        if self.tm:
+            # Все параграфы документа сравниваются с TM одним пакетом
+            for paragraph, (index, _, match_type) in zip(unique, self.tm.best_match_many(unique)):
+                if match_type in ('exact', 'fuzzy'):
+                    translations[paragraph] = self.tm.memory[index]['target']
+            if translations:
+                print(f"✓ Найдено в TM: {len(translations)} параграфов")
+        
+        # В батч попадают только соседние промахи TM: найденный параграф
+        # разрывает батч, и LLM не получает вместе далёкие друг от друга
+        # параграфы как общий контекст
+        chunks: List[tuple] = []
+        run_start = None
+        for i, paragraph in enumerate(unique + [None]):
+            if paragraph is not None and paragraph not in translations:
+                if run_start is None:
+                    run_start = i
+                continue
+            if run_start is not None:
+                chunks.extend(
+                    (j, unique[j:min(j + batch_size, i)]) for j in range(run_start, i, batch_size)
+                )
+                run_start = None
+        
+        total_batches = len(chunks)
+        batches = [(batch_num, i, batch) for batch_num, (i, batch) in enumerate(chunks, 1)]
+        
+        def run(item):
+            batch_num, i, batch = item
+            return self._translate_batch(batch_num, total_batches, i, batch, len(unique), use_glossary)
+        
+        # Батчи независимы: при workers > 1 запросы к API идут параллельно,
+        # лимиты провайдера соблюдает RateLimiter редактора; порядок сохраняется
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(run, batches))
+        else:
+            results = [run(item) for item in batches]
+        
+        # MT кеш и TM пишут на диск пачками; фиксируем хвост на границе документа
+        if self.cache:
+            self.cache.flush()
+        if self.tm:
+            self.tm.flush()
+        
+        for (_, _, batch), batch_result in zip(batches, results):
+            translations.update(zip(batch, batch_result))
+        # Генератор: write_docx добавляет параграфы по одному, второй список не нужен
+        translated_paragraphs = (translations[p] for p in paragraphs)
         
         print(f"\n{'='*60}")
         print(f"Сохранение: {output_path}")
@@ -226,12 +373,83 @@ class Translator:
             print(f"  - Промахи: {stats['misses']}")
             print(f"  - Hit rate: {stats['hit_rate']}")
         
+        if self.llm_cache:
+            stats = self.llm_cache.get_stats()
+            print(f"\nСтатистика LLM кеша:")
+            print(f"  - Попадания: {stats['hits']}")
+            print(f"  - Промахи: {stats['misses']}")
+            print(f"  - Hit rate: {stats['hit_rate']}")
+        
+        if self.semantic_cache:
+            stats = self.semantic_cache.get_stats()
+            print(f"\nСтатистика семантического кеша:")
+            print(f"  - Попадания: {stats['hits']}")
+            print(f"  - Промахи: {stats['misses']}")
+            print(f"  - Hit rate: {stats['hit_rate']}")
+        
         print(f"\n✓ ПЕРЕВОД ЗАВЕРШЁН!")
         print(f"{'='*60}\n")
     
+    def _translate_batch(self, batch_num: int, total_batches: int, start: int,
+                         batch: List[str], total_paragraphs: int,
+                         use_glossary: bool) -> List[str]:
+        """
+        Перевести один батч параграфов.
+        
+        Returns:
+            Переводы по одному на параграф батча. Если перевод батча не делится
+            на параграфы, параграфы переводятся по одному; при ошибке у каждого
+            параграфа - маркер ошибки. Перевод всегда относится к своему
+            параграфу, поэтому его можно подставить во все повторы параграфа
+        """
+        batch_text = '\n\n'.join(batch)
+        
+        print(f"\n--- Батч {batch_num}/{total_batches} ---")
+        print(f"Параграфы {start+1}-{min(start+len(batch), total_paragraphs)}")
+        
+        try:
+            translated_batch = self.translate_text(batch_text, use_glossary=use_glossary)
+            
+            # Разделяем обратно на параграфы
+            translated_batch_paragraphs = translated_batch.split('\n\n')
+            
+            # Один параграф - весь перевод его; иначе количество должно совпасть
+            if len(batch) == 1:
+                print(f"✓ Батч {batch_num} переведён успешно")
+                return [translated_batch]
+            if len(translated_batch_paragraphs) == len(batch):
+                print(f"✓ Батч {batch_num} переведён успешно")
+                # TM хранит и отдельные параграфы: при повторном переводе
+                # они находятся в TM, даже если попадут в другой батч
+                if self.tm:
+                    for paragraph, paragraph_translation in zip(batch, translated_batch_paragraphs):
+                        self.tm.add(paragraph, paragraph_translation)
+                return translated_batch_paragraphs
+            
+        except Exception as e:
+            print(f"✗ Ошибка при переводе батча {batch_num}: {e}")
+            import traceback
+            traceback.print_exc()
+            return [f"[ERROR: Translation failed for batch {batch_num}]"] * len(batch)
+        
+        # Перевод не делится на параграфы батча - переводим их по одному:
+        # слитый текст нельзя привязать ни к одному параграфу
+        print(f"⚠️ Батч {batch_num} не делится на параграфы, переводим по одному")
+        results = []
+        for paragraph in batch:
+            try:
+                results.append(self.translate_text(paragraph, use_glossary=use_glossary))
+            except Exception as e:
+                print(f"✗ Ошибка при переводе параграфа батча {batch_num}: {e}")
+                results.append(f"[ERROR: Translation failed for batch {batch_num}]")
+        return results
+    
     def add_to_glossary(self, source: str, target: str):
         """Добавить запись в глоссарий."""
         self.glossary.add(source, target)
+        # Готовые переводы сделаны со старым глоссарием
+        with self._memo_lock:
+            self._memo.clear()
     
     def get_glossary(self) -> Dict[str, str]:
         """Получить весь глоссарий."""